@@ -0,0 +1,337 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+
+from honors2 import Game, WinningPlayer
+from tablebase import Tablebase, get_default_path
+
+# Positions are passed to workers as (boxes_per_row, edges) keys, where edges is an
+# integer in which bit k is set if the edge with edge id k (see Game.edges) has been
+# drawn. Identical positions have identical keys, however their edges were listed.
+#
+# Each analysis is a dictionary containing:
+#
+#  moves               - a list of (move, score) pairs for every valid move, best first,
+#                        where score is the margin of remaining boxes the player making
+#                        the move can guarantee over the other player.
+#  best_move           - the move with the highest score, or None if the game is over.
+#  exact               - True if the scores are for the rest of the game, and False if
+#                        they only look depth moves ahead (not counting captures).
+#  winning_player_move - the move Winning Player would make from the position.
+
+# State kept by each worker process between tasks.
+_worker = {
+    'depth': 3,
+    'use_tablebases': True,
+    # Maps each board size to its open Tablebase, or to None if there is none.
+    'tablebases': {},
+}
+
+# Maps each board size to Game.edge_ids for that size, so that keys can be
+# made without setting up a game for every position.
+_edge_ids = {}
+
+def get_position_key(boxes_per_row, edges):
+    '''Takes a board size and an iterable of drawn edges as (i, j) pairs of dots,
+    in either order, and returns the key identifying the position.'''
+    if boxes_per_row not in _edge_ids:
+        _edge_ids[boxes_per_row] = Game(boxes_per_row).edge_ids
+    edge_ids = _edge_ids[boxes_per_row]
+
+    position = 0
+    for a, b in edges:
+        edge = (min(a, b), max(a, b))
+        if edge not in edge_ids:
+            raise ValueError('dots {} and {} are not adjacent'.format(a, b))
+        position |= 1 << edge_ids[edge]
+    return boxes_per_row, position
+
+def _init_worker(depth, use_tablebases):
+    '''Sets up the state of a worker process.'''
+    _worker['depth'] = depth
+    _worker['use_tablebases'] = use_tablebases
+    _worker['tablebases'] = {}
+
+def _get_tablebase(boxes_per_row):
+    '''Returns the tablebase for a board size, opened once per worker,
+    or None if tablebases are not used or none has been written.'''
+    tablebases = _worker['tablebases']
+    if boxes_per_row not in tablebases:
+        path = get_default_path(boxes_per_row)
+        if _worker['use_tablebases'] and os.path.exists(path):
+            tablebases[boxes_per_row] = Tablebase(path)
+        else:
+            tablebases[boxes_per_row] = None
+    return tablebases[boxes_per_row]
+
+# Kinds of value stored in the transposition table: the exact value of a position,
+# or a lower or upper bound on it when the search of the position was cut off.
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+def _search(game, sides, drawn, depth, alpha, beta, table):
+    '''Returns the margin of remaining boxes the player about to move can guarantee
+    within depth moves, where sides is the number of drawn sides of each box and drawn
+    is an integer in which bit k is set if edge id k has been drawn. Captures do not
+    count towards depth, so a chain is always taken or declined in full. Once depth is
+    used up, the player may only capture or stop.
+
+    table maps (drawn, depth) to what is known about a position's value. Because
+    captures can be made in any order, many lines reach the same position, and the
+    table keeps them from being searched more than once.'''
+    key = (drawn, depth)
+    entry = table.get(key)
+    if entry is not None:
+        kind, value = entry
+        if kind == EXACT:
+            return value
+        if kind == LOWER_BOUND and value >= beta:
+            return value
+        if kind == UPPER_BOUND and value <= alpha:
+            return value
+
+    original_alpha = alpha
+
+    best = None
+    if depth == 0:
+        best = 0
+        alpha = max(alpha, best)
+
+    # Captures are tried first, since they are often best and keep the turn.
+    captures = []
+    others = []
+    for edge_id in range(len(game.edges)):
+        if drawn >> edge_id & 1:
+            continue
+        boxes_closed = 0
+        for box in game.edge_boxes[edge_id]:
+            if sides[box] == 3:
+                boxes_closed += 1
+        if boxes_closed:
+            captures.append( (edge_id, boxes_closed) )
+        elif depth > 0:
+            others.append( (edge_id, 0) )
+
+    if best is None and not captures and not others:
+        return 0
+
+    if alpha < beta:
+        for edge_id, boxes_closed in captures + others:
+            for box in game.edge_boxes[edge_id]:
+                sides[box] += 1
+
+            child = drawn | (1 << edge_id)
+            if boxes_closed:
+                value = boxes_closed + _search(game, sides, child, depth,
+                    alpha - boxes_closed, beta - boxes_closed, table)
+            else:
+                value = -_search(game, sides, child, depth - 1, -beta, -alpha, table)
+
+            for box in game.edge_boxes[edge_id]:
+                sides[box] -= 1
+
+            if best is None or value > best:
+                best = value
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+
+    if best <= original_alpha:
+        table[key] = (UPPER_BOUND, best)
+    elif best >= beta:
+        table[key] = (LOWER_BOUND, best)
+    else:
+        table[key] = (EXACT, best)
+
+    return best
+
+def _evaluate_moves(game, depth):
+    '''Returns a list of (move, score) pairs for every valid move in game, searching
+    depth moves ahead, and whether the scores are for the rest of the game.'''
+    sides = list(game.box_sides)
+    drawn = 0
+    for edge_id, (i, j) in enumerate(game.edges):
+        if game.am[i][j] == 2:
+            drawn |= 1 << edge_id
+
+    # With no more non-capturing moves left than depth, the search reaches the end.
+    exact = len(game.valid_moves) - len(game.capturing_moves) <= depth
+
+    # Shared by the searches of every move, which often reach the same positions.
+    table = {}
+
+    # More than any margin, so it never cuts a search off.
+    unbounded = game.total_boxes + 1
+
+    results = []
+    for move in game.valid_moves:
+        edge_id = game.edge_ids[move]
+        boxes_closed = 0
+        for box in game.edge_boxes[edge_id]:
+            if sides[box] == 3:
+                boxes_closed += 1
+
+        for box in game.edge_boxes[edge_id]:
+            sides[box] += 1
+
+        child = drawn | (1 << edge_id)
+        if boxes_closed:
+            value = boxes_closed + _search(game, sides, child, depth, -unbounded, unbounded, table)
+        else:
+            value = -_search(game, sides, child, depth - 1, -unbounded, unbounded, table)
+
+        for box in game.edge_boxes[edge_id]:
+            sides[box] -= 1
+
+        results.append( (move, value) )
+
+    return results, exact
+
+def analyze_position(key):
+    '''Analyzes the position with the given key (see get_position_key()) and
+    returns its analysis. Runs in a worker process, but can be called directly.'''
+    boxes_per_row, position = key
+
+    game = Game(boxes_per_row)
+    game.load_position(edge for edge_id, edge in enumerate(game.edges) if position >> edge_id & 1)
+
+    tablebase = _get_tablebase(boxes_per_row)
+    if tablebase is not None:
+        moves = tablebase.evaluate_moves(game)
+        exact = True
+    else:
+        moves, exact = _evaluate_moves(game, _worker['depth'])
+
+    # Sorts by score, keeping moves with equal scores in edge id order.
+    moves.sort(key=lambda pair: -pair[1])
+
+    best_move = None
+    winning_player_move = None
+    if moves:
+        best_move = moves[0][0]
+
+        # A new Winning Player sees every drawn edge at once, so it can mark a box
+        # which is already closed as closable and pick its drawn final side. In a
+        # game, Game.move() would refuse that move and Winning Player would decide
+        # again, so the same is done here until it picks a valid move.
+        winning_player = WinningPlayer(game)
+        while winning_player_move not in game.valid_moves:
+            move = winning_player.determine_next_move(game).split()
+            winning_player_move = (int(move[0]), int(move[1]))
+
+    return {
+        'moves': moves,
+        'best_move': best_move,
+        'exact': exact,
+        'winning_player_move': winning_player_move,
+    }
+
+class BatchAnalyzer:
+    '''Analyzes batches of positions on a pool of worker processes which is kept
+    between batches, so that starting processes and opening tablebases is paid
+    for once rather than per position or per batch.'''
+
+    def __init__(self, processes=None, depth=3, use_tablebases=True):
+        '''Starts the pool with the given number of processes (the number of CPUs
+        by default). Positions without a tablebase are searched depth moves ahead.'''
+        if processes is None:
+            processes = os.cpu_count() or 1
+        self.processes = processes
+        self.pool = multiprocessing.Pool(processes, _init_worker, (depth, use_tablebases))
+
+    def analyze(self, positions):
+        '''Takes a list of (boxes_per_row, edges) pairs, where edges is an iterable
+        of drawn edges as (i, j) pairs of dots, and returns a list with the analysis
+        of each position in the same order. Each distinct position is only analyzed once.'''
+        keys = [get_position_key(boxes_per_row, edges) for boxes_per_row, edges in positions]
+
+        # dict.fromkeys() keeps the first occurrence of each key in order.
+        unique_keys = list(dict.fromkeys(keys))
+
+        # Hands out positions a few chunks per process at a time, which keeps the
+        # processes busy without sending every position in its own message.
+        chunksize = max(1, len(unique_keys) // (4 * self.processes))
+        analyses = dict(zip(unique_keys, self.pool.map(analyze_position, unique_keys, chunksize)))
+
+        return [analyses[key] for key in keys]
+
+    def close(self):
+        '''Shuts down the worker processes.'''
+        self.pool.close()
+        self.pool.join()
+
+def sample_positions(boxes_per_row, games, seed):
+    '''Returns every position reached in the given number of games of Winning Player
+    against Random Player, as (boxes_per_row, edges) pairs, for trying out the analysis.'''
+    random.seed(seed)
+
+    class Recorder:
+        def __init__(self):
+            self.positions = []
+
+        def record_move(self, game, player, move):
+            edges = [edge for edge in game.edges if game.am[edge[0]][edge[1]] == 2]
+            self.positions.append( (boxes_per_row, edges) )
+
+        def record_outcome(self, game, outcome):
+            pass
+
+    recorder = Recorder()
+    for _ in range(games):
+        Game(boxes_per_row).play_game_without_output(recorder)
+    return recorder.positions
+
+def main():
+    parser = argparse.ArgumentParser(description='Suggests the best move, with a score for '
+        'every move, for a batch of positions using a pool of worker processes.')
+    parser.add_argument('input', nargs='?',
+        help='file with one position per line as JSON, e.g. {"boxes_per_row": 3, '
+        '"edges": [[0, 1], [1, 5]]}; if not given, positions from sample games are used')
+    parser.add_argument('--output', default='analysis.jsonl',
+        help='file the analyses are written to, one per line (default: analysis.jsonl)')
+    parser.add_argument('--processes', type=int, default=None,
+        help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--depth', type=int, default=3,
+        help='moves to search ahead when there is no tablebase, not counting captures (default: 3)')
+    parser.add_argument('--no-tablebases', action='store_true',
+        help='search every position even if a tablebase file exists')
+    parser.add_argument('--boxes-per-row', type=int, default=3,
+        help='size of the board for sample games (default: 3)')
+    parser.add_argument('--games', type=int, default=20,
+        help='number of sample games (default: 20)')
+    parser.add_argument('--seed', type=int, default=0,
+        help='random seed for sample games (default: 0)')
+    args = parser.parse_args()
+
+    if args.input is None:
+        positions = sample_positions(args.boxes_per_row, args.games, args.seed)
+    else:
+        positions = []
+        fp = open(args.input)
+        for line in fp:
+            if line.strip():
+                position = json.loads(line)
+                positions.append( (position['boxes_per_row'], position['edges']) )
+        fp.close()
+
+    analyzer = BatchAnalyzer(args.processes, args.depth, not args.no_tablebases)
+    start = time.perf_counter()
+    analyses = analyzer.analyze(positions)
+    elapsed = time.perf_counter() - start
+    analyzer.close()
+
+    fp = open(args.output, 'w')
+    for analysis in analyses:
+        fp.write(json.dumps(analysis) + '\n')
+    fp.close()
+
+    unique = len(set(get_position_key(boxes_per_row, edges) for boxes_per_row, edges in positions))
+    print('Analyzed {} positions ({} distinct) in {:.2f} s with {} processes'.format(
+        len(positions), unique, elapsed, analyzer.processes))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+import argparse
+import time
+
+import numpy as np
+
+from honors2 import Game, WinningPlayer
+
+class BatchedWinningPlayer:
+    '''Runs Winning Player's strategy for many games at once. Each game's state is a
+    row of a set of arrays, and every call to determine_next_moves() decides the next
+    move for a group of games with array operations instead of a loop over boxes.
+
+    The moves chosen are the same as those WinningPlayer.determine_next_move() would
+    choose for each game on its own:
+
+     - If a box has just become closable (both setup moves and one closing move made),
+       the other closing move is chosen. If several have, the last box wins.
+     - Otherwise the first move in ordered_moves which has not been made is chosen.
+     - Otherwise the valid move with the lowest edge id is chosen.
+
+    (WinningPlayer's consecutive move handling never runs, because consecutive_move
+    is never set, so it has no counterpart here.)'''
+
+    def __init__(self, game, n_games):
+        '''Takes a Game of the size being played, used only for its layout, and
+        the number of games to keep state for.'''
+        player = WinningPlayer(game)
+
+        # The ordered moves as edge ids.
+        self.ordered_moves = np.array([game.edge_ids[move] for move in player.ordered_moves],
+            dtype=np.int64)
+
+        # Edge ids of each box's setup moves and closing moves, indexed by box number.
+        self.setup_moves = np.array(player.setup_moves, dtype=np.int64).reshape(-1, 2)
+        self.closing_moves = np.array(player.closing_moves, dtype=np.int64).reshape(-1, 2)
+
+        total_boxes = game.total_boxes
+
+        # Whether each box has been set up or made closable, for each game.
+        self.setup = np.zeros((n_games, total_boxes), dtype=bool)
+        self.closable = np.zeros((n_games, total_boxes), dtype=bool)
+
+        # For each game, the position in ordered_moves before which
+        # every move has already been made.
+        self.position = np.zeros(n_games, dtype=np.int64)
+
+    def determine_next_moves(self, games, drawn):
+        '''Takes an array of game indexes and the array of drawn edges for every game,
+        and returns an array of the edge id of the next move for each of those games.'''
+        rows = drawn[games]
+
+        # Marks any newly setup boxes as setup.
+        self.setup[games] |= rows[:, self.setup_moves[:, 0]] & rows[:, self.setup_moves[:, 1]]
+
+        # Finds boxes which have become closable since the last call.
+        first_closing_made = rows[:, self.closing_moves[:, 0]]
+        second_closing_made = rows[:, self.closing_moves[:, 1]]
+        newly_closable = (self.setup[games] & ~self.closable[games] &
+            (first_closing_made | second_closing_made))
+        self.closable[games] |= newly_closable
+
+        # Skips past ordered moves which have already been made.
+        plan_length = len(self.ordered_moves)
+        while True:
+            in_plan = self.position[games] < plan_length
+            move_index = np.minimum(self.position[games], plan_length - 1)
+            made = in_plan & rows[np.arange(len(games)), self.ordered_moves[move_index]]
+            if not made.any():
+                break
+            self.position[games[made]] += 1
+
+        in_plan = self.position[games] < plan_length
+        move_index = np.minimum(self.position[games], plan_length - 1)
+        next_moves = np.where(in_plan, self.ordered_moves[move_index], np.argmax(~rows, axis=1))
+
+        # Closing the last newly closable box takes priority over the plan.
+        has_closable = newly_closable.any(axis=1)
+        if has_closable.any():
+            total_boxes = newly_closable.shape[1]
+            last_box = total_boxes - 1 - np.argmax(newly_closable[:, ::-1], axis=1)
+            last_box = last_box[has_closable]
+            first_made = first_closing_made[has_closable, last_box]
+            final_moves = np.where(first_made, self.closing_moves[last_box, 1],
+                self.closing_moves[last_box, 0])
+            next_moves[has_closable] = final_moves
+
+        # Moves from ordered_moves are made straight away.
+        self.position[games[~has_closable & in_plan]] += 1
+
+        return next_moves
+
+def choose_random_moves(games, drawn, rng):
+    '''Takes an array of game indexes, the array of drawn edges for every game and
+    a numpy random Generator, and returns an array of the edge id of a move chosen
+    uniformly at random from the valid moves of each of those games.'''
+    valid = ~drawn[games]
+    valid_counts = valid.sum(axis=1)
+    choices = (rng.random(len(games)) * valid_counts).astype(np.int64)
+    return np.argmax(np.cumsum(valid, axis=1) > choices[:, None], axis=1)
+
+def play_games_batched(boxes_per_row, n_games, rng, record_moves=False):
+    '''Plays n_games games of Winning Player against Random Player in lockstep,
+    each with a random starting player, the same way as Game.play_game_without_output().
+    Returns a tuple of arrays (rounds, winning player scores, random player scores,
+    outcomes), where each outcome is 0 if Winning Player won, 1 if Random Player won
+    and 2 if it was a tie. If record_moves is True, a list of the moves made in each
+    game, as (player, edge id) pairs, and the starting players are also returned.'''
+    game = Game(boxes_per_row)
+    total_edges = len(game.edges)
+    total_boxes = game.total_boxes
+
+    # For each edge id, the boxes it is a side of, padded with -1.
+    edge_boxes = np.full((total_edges, 2), -1, dtype=np.int64)
+    for edge_id, boxes in enumerate(game.edge_boxes):
+        edge_boxes[edge_id, :len(boxes)] = boxes
+
+    winning_player = BatchedWinningPlayer(game, n_games)
+
+    drawn = np.zeros((n_games, total_edges), dtype=bool)
+    box_sides = np.zeros((n_games, total_boxes), dtype=np.int8)
+    scores = np.zeros((n_games, 2), dtype=np.int64)
+    rounds = np.zeros(n_games, dtype=np.int64)
+
+    starting_players = rng.integers(0, 2, n_games)
+    active_player = starting_players.copy()
+
+    moves = None
+    if record_moves:
+        moves = [[] for _ in range(n_games)]
+
+    while True:
+        playing = np.flatnonzero(scores.sum(axis=1) < total_boxes)
+        if len(playing) == 0:
+            break
+
+        rounds[playing] += 1
+
+        chosen = np.empty(len(playing), dtype=np.int64)
+
+        winning_turn = active_player[playing] == 0
+        if winning_turn.any():
+            chosen[winning_turn] = winning_player.determine_next_moves(
+                playing[winning_turn], drawn)
+        if (~winning_turn).any():
+            chosen[~winning_turn] = choose_random_moves(playing[~winning_turn], drawn, rng)
+
+        if record_moves:
+            for g, edge_id in zip(playing, chosen):
+                moves[g].append( (int(active_player[g]), int(edge_id)) )
+
+        # A move between dots which are already connected is not made, and
+        # the same player moves again, just like Game.move() returning -2.
+        valid = ~drawn[playing, chosen]
+        games = playing[valid]
+        edges = chosen[valid]
+
+        drawn[games, edges] = True
+
+        boxes_closed = np.zeros(len(games), dtype=np.int64)
+        for side in range(2):
+            boxes = edge_boxes[edges, side]
+            has_box = boxes >= 0
+            box_games = games[has_box]
+            boxes = boxes[has_box]
+            box_sides[box_games, boxes] += 1
+            boxes_closed[has_box] += box_sides[box_games, boxes] == 4
+
+        players = active_player[games]
+        np.add.at(scores, (games, players), boxes_closed)
+
+        # If no point was scored, switches active player to the other player.
+        no_point = boxes_closed == 0
+        active_player[games[no_point]] = 1 - players[no_point]
+
+    outcomes = np.where(scores[:, 0] > scores[:, 1], 0, np.where(scores[:, 1] > scores[:, 0], 1, 2))
+
+    if record_moves:
+        return rounds, scores[:, 0], scores[:, 1], outcomes, moves, starting_players
+    return rounds, scores[:, 0], scores[:, 1], outcomes
+
+def main():
+    parser = argparse.ArgumentParser(description='Plays many games of Winning Player '
+        'against Random Player in lockstep using array operations.')
+    parser.add_argument('--boxes-per-row', type=int, default=4,
+        help='size of the board (default: 4)')
+    parser.add_argument('--games', type=int, default=10000,
+        help='number of games to play (default: 10000)')
+    parser.add_argument('--seed', type=int, default=0,
+        help='random seed (default: 0)')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+
+    start = time.perf_counter()
+    rounds, score_1, score_2, outcomes = play_games_batched(args.boxes_per_row, args.games, rng)
+    elapsed = time.perf_counter() - start
+
+    print('Total number of rounds played: {}'.format(rounds.sum()))
+    print('Winning Player average: {}'.format(score_1.mean()))
+    print('Random Player average: {}'.format(score_2.mean()))
+    print('Winning Player total wins: {}'.format((outcomes == 0).sum()))
+    print('Random Player total wins: {}'.format((outcomes == 1).sum()))
+    print('Ties: {}'.format((outcomes == 2).sum()))
+    print('Games per second: {:.0f}'.format(args.games / elapsed))
+
+if __name__ == '__main__':
+    main()
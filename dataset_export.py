@@ -0,0 +1,239 @@
+import argparse
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from honors2 import Game
+
+# The arrays written for every position, with their types. Each position is the
+# board just before a move is made. Moves along an edge which has already been drawn
+# (such as Winning Player's retries when Game.move() returns -2) are not recorded,
+# since they leave the board as it was and the same position is recorded again
+# with the move which is actually made from it.
+#
+#  edges        - which edges have been drawn, as bits packed eight to a byte where
+#                 bit k % 8 of byte k // 8 is edge id k (see Game.edges).
+#                 Use unpack_edges() to get one value per edge.
+#  board        - Game.board: -1 for an open box, or the player who closed it.
+#  side_to_move - the player about to move.
+#  move         - edge id of the move made, or -1 if it was not between adjacent dots.
+#  outcome      - 0 if player A won the game, 1 if player B won and 2 if it was a tie.
+#  game         - number of the game the position belongs to.
+FIELDS = {
+    'edges': np.uint8,
+    'board': np.int8,
+    'side_to_move': np.int8,
+    'move': np.int32,
+    'outcome': np.int8,
+    'game': np.int64,
+}
+
+class PositionWriter:
+    '''Records every position of the games it is passed to (as the recorder of
+    Game.play_game_between() or Game.play_game_without_output()) into preallocated
+    arrays, and writes them to .npy files in directory one chunk at a time. Chunks are
+    only written between games, so every position's outcome is known when it is written.'''
+
+    def __init__(self, directory, boxes_per_row, chunk_size=65536):
+        self.directory = directory
+        self.boxes_per_row = boxes_per_row
+        self.chunk_size = chunk_size
+
+        os.makedirs(directory, exist_ok=True)
+
+        game = Game(boxes_per_row)
+        self.total_edges = len(game.edges)
+
+        # Position of each edge id in Game.drawn_edges, and the number of bytes
+        # needed to hold Game.drawn_edges.
+        self.edge_bits = np.array([game.edge_bit(*edge) for edge in game.edges], dtype=np.int64)
+        self.bitboard_bytes = (2 * game.total_dots + 7) // 8
+
+        # Number of values stored per position for the fields which store more than one.
+        self.widths = {
+            'edges': (self.total_edges + 7) // 8,
+            'board': game.total_boxes,
+        }
+
+        # Room for a full chunk plus one more game, so that a chunk
+        # rarely needs to grow before the game in progress ends.
+        self.capacity = chunk_size + 4 * self.total_edges
+        self.buffers = {}
+        for name in FIELDS:
+            self.buffers[name] = self._allocate(name, self.capacity)
+
+        # Game.drawn_edges for each position, as raw bytes. These are only converted
+        # to the edges field, in bulk, when a chunk is written. The bytearray is shared
+        # with a numpy array so that positions can be copied in without calling numpy.
+        self.bitboards = bytearray(self.capacity * self.bitboard_bytes)
+
+        # Number of positions in the buffers, and the first of them
+        # which belongs to the game in progress.
+        self.rows = 0
+        self.game_start = 0
+
+        self.game_number = 0
+
+        # Number of positions written to each chunk so far.
+        self.chunk_rows = []
+
+    def _allocate(self, name, rows):
+        '''Returns an empty buffer for a field with room for rows positions.'''
+        if name in self.widths:
+            return np.empty((rows, self.widths[name]), dtype=FIELDS[name])
+        return np.empty(rows, dtype=FIELDS[name])
+
+    def _grow(self):
+        '''Doubles the size of the buffers. Only happens if a single game is too
+        long to fit in the room left after a full chunk.'''
+        self.capacity *= 2
+        for name in FIELDS:
+            buffer = self._allocate(name, self.capacity)
+            buffer[:self.rows] = self.buffers[name][:self.rows]
+            self.buffers[name] = buffer
+        self.bitboards.extend(bytes(len(self.bitboards)))
+
+    def record_move(self, game, player, move):
+        '''Records the position of game before player makes move (a string of two dots),
+        unless move is along an edge which has already been drawn.'''
+        try:
+            a, b = move.split()
+            a = int(a)
+            b = int(b)
+            edge_id = game.edge_ids[(min(a, b), max(a, b))]
+        except (ValueError, KeyError):
+            edge_id = -1
+
+        if edge_id != -1 and game.am[min(a, b)][max(a, b)] == 2:
+            return
+
+        if self.rows == self.capacity:
+            self._grow()
+
+        row = self.rows
+
+        start = row * self.bitboard_bytes
+        self.bitboards[start:start + self.bitboard_bytes] = game.drawn_edges.to_bytes(
+            self.bitboard_bytes, 'little')
+
+        self.buffers['board'][row] = game.board
+        self.buffers['side_to_move'][row] = player
+        self.buffers['game'][row] = self.game_number
+        self.buffers['move'][row] = edge_id
+
+        self.rows += 1
+
+    def record_outcome(self, game, outcome):
+        '''Fills in the outcome of every position of the game which just finished,
+        and writes out a chunk if enough positions have been recorded.'''
+        self.buffers['outcome'][self.game_start:self.rows] = outcome
+        self.game_number += 1
+        self.game_start = self.rows
+
+        if self.rows >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        '''Writes the positions of every finished game to a new chunk.'''
+        rows = self.game_start
+        if rows == 0:
+            return
+
+        # Unpacks the drawn edge bitboards, reorders them by edge id and packs them again.
+        bitboards = np.frombuffer(self.bitboards, dtype=np.uint8, count=rows * self.bitboard_bytes)
+        bits = np.unpackbits(bitboards.reshape(rows, self.bitboard_bytes), axis=1, bitorder='little')
+        self.buffers['edges'][:rows] = np.packbits(bits[:, self.edge_bits], axis=1, bitorder='little')
+
+        chunk = len(self.chunk_rows)
+        for name in FIELDS:
+            np.save(os.path.join(self.directory, '{}_{:05d}.npy'.format(name, chunk)),
+                self.buffers[name][:rows])
+        self.chunk_rows.append(rows)
+
+        # Moves the positions of a game in progress, if any, to the start of the buffers.
+        leftover = self.rows - rows
+        for name in FIELDS:
+            self.buffers[name][:leftover] = self.buffers[name][rows:self.rows]
+        self.bitboards[:leftover * self.bitboard_bytes] = \
+            self.bitboards[rows * self.bitboard_bytes:self.rows * self.bitboard_bytes]
+        self.rows = leftover
+        self.game_start = 0
+
+    def close(self):
+        '''Writes the remaining finished games and a manifest describing the chunks.
+        Positions of a game which has not finished are discarded.'''
+        self.flush()
+
+        manifest = {
+            'boxes_per_row': self.boxes_per_row,
+            'total_edges': self.total_edges,
+            'games': self.game_number,
+            'chunk_rows': self.chunk_rows,
+            'fields': {name: np.dtype(dtype).name for name, dtype in FIELDS.items()},
+        }
+        fp = open(os.path.join(self.directory, 'manifest.json'), 'w')
+        json.dump(manifest, fp, indent=2)
+        fp.close()
+
+def load_positions(directory):
+    '''Opens a dataset written by PositionWriter without reading it into memory.
+    Returns the manifest and a dictionary mapping each field to a list of
+    memory-mapped arrays, one per chunk.'''
+    fp = open(os.path.join(directory, 'manifest.json'))
+    manifest = json.load(fp)
+    fp.close()
+
+    arrays = {}
+    for name in FIELDS:
+        arrays[name] = []
+        for chunk in range(len(manifest['chunk_rows'])):
+            path = os.path.join(directory, '{}_{:05d}.npy'.format(name, chunk))
+            arrays[name].append(np.load(path, mmap_mode='r'))
+
+    return manifest, arrays
+
+def unpack_edges(packed, total_edges):
+    '''Takes an array of packed edges and returns an array of 0s and 1s with
+    one column per edge id.'''
+    return np.unpackbits(packed, axis=-1, count=total_edges, bitorder='little')
+
+def export_games(directory, boxes_per_row, rounds, seed, chunk_size=65536):
+    '''Plays rounds games of Winning Player against Random Player, as main() in
+    honors2 does, recording every position to directory.'''
+    random.seed(seed)
+
+    writer = PositionWriter(directory, boxes_per_row, chunk_size)
+
+    for _ in range(rounds):
+        game = Game(boxes_per_row)
+        game.play_game_without_output(writer)
+
+    writer.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Plays games of Winning Player against '
+        'Random Player and writes every position to chunked .npy files.')
+    parser.add_argument('directory', help='directory the dataset is written to')
+    parser.add_argument('--boxes-per-row', type=int, default=4,
+        help='size of the board (default: 4)')
+    parser.add_argument('--rounds', type=int, default=1000,
+        help='number of games to play (default: 1000)')
+    parser.add_argument('--seed', type=int, default=0,
+        help='random seed (default: 0)')
+    parser.add_argument('--chunk-size', type=int, default=65536,
+        help='number of positions per chunk (default: 65536)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    export_games(args.directory, args.boxes_per_row, args.rounds, args.seed, args.chunk_size)
+    elapsed = time.perf_counter() - start
+
+    manifest, arrays = load_positions(args.directory)
+    print('Wrote {} positions from {} games in {} chunks ({:.2f} s)'.format(
+        sum(manifest['chunk_rows']), manifest['games'], len(manifest['chunk_rows']), elapsed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import random
+import socket
+import socketserver
+import threading
+import time
+from game_results import add_result, format_summary, merge_aggregates, new_aggregate, summarize_aggregate
+from honors2 import Game
+
+# Workers and the coordinator talk over TCP, one JSON message per line:
+#
+#  worker      -> coordinator: {"type": "request"}
+#  coordinator -> worker:      {"type": "lease", "lease_id": ..., "boxes_per_row": ...,
+#                               "seed": ..., "start": ..., "stop": ...}
+#                              {"type": "wait"} if every range is leased out but not finished
+#                              {"type": "done"} once every range is finished
+#  worker      -> coordinator: {"type": "result", "lease_id": ..., "aggregate": ...}
+#
+# A lease is a range of game numbers for one board size. If a worker disconnects or
+# does not return a result before its lease times out, the range is put back in the
+# queue for another worker. Every game is seeded from its own number, so it plays out
+# the same whichever worker plays it, and only the first result for a range is kept.
+
+def get_game_seed(seed, boxes_per_row, index):
+    '''Returns the random seed used for game number index on a board size.'''
+    return '{}-{}-{}'.format(seed, boxes_per_row, index)
+
+def play_range(boxes_per_row, seed, start, stop):
+    '''Plays games number start to stop - 1 of Winning Player against Random Player
+    and returns an aggregate of the results.'''
+    aggregate = new_aggregate()
+    for index in range(start, stop):
+        random.seed(get_game_seed(seed, boxes_per_row, index))
+        game = Game(boxes_per_row)
+        add_result(aggregate, game.play_game_without_output())
+    return aggregate
+
+def get_ranges(jobs, lease_size):
+    '''Splits jobs, a list of (boxes_per_row, rounds) pairs, into a list of
+    (boxes_per_row, start, stop) ranges of at most lease_size games.'''
+    ranges = []
+    for boxes_per_row, rounds in jobs:
+        for start in range(0, rounds, lease_size):
+            ranges.append( (boxes_per_row, start, min(start + lease_size, rounds)) )
+    return ranges
+
+def run_single_process(jobs, seed, lease_size):
+    '''Plays every job in this process, in the same ranges the coordinator would
+    hand out. Returns a dictionary mapping each board size to its aggregate.'''
+    results = {}
+    for boxes_per_row, start, stop in get_ranges(jobs, lease_size):
+        aggregate = results.setdefault(boxes_per_row, new_aggregate())
+        merge_aggregates(aggregate, play_range(boxes_per_row, seed, start, stop))
+    return results
+
+class Coordinator:
+    '''Hands out ranges of games to workers, re-queues the ranges of workers which
+    disconnect or time out, and merges the aggregates they send back.'''
+
+    def __init__(self, jobs, seed, lease_size=100, lease_timeout=60.0):
+        self.seed = seed
+        self.lease_timeout = lease_timeout
+
+        self.lock = threading.Lock()
+
+        # Set once every range has been finished.
+        self.finished = threading.Event()
+
+        # Ranges waiting to be leased.
+        self.pending = collections.deque(get_ranges(jobs, lease_size))
+
+        # Total number of ranges, and the ranges which have been finished.
+        self.total_ranges = len(self.pending)
+        self.done_ranges = set()
+
+        # Maps each lease id to its range, the connection holding it and its deadline.
+        self.leases = {}
+        self.next_lease_id = 0
+
+        # Number of leases which were put back in the queue.
+        self.requeued = 0
+
+        # Maps each board size to the aggregate of its finished ranges.
+        self.results = {}
+        for boxes_per_row, rounds in jobs:
+            self.results[boxes_per_row] = new_aggregate()
+
+        if self.total_ranges == 0:
+            self.finished.set()
+
+    def _requeue(self, lease_id):
+        '''Puts the range of a lease back in the queue unless it has been finished.
+        Must be called with the lock held.'''
+        lease_range, _, _ = self.leases.pop(lease_id)
+        if lease_range not in self.done_ranges:
+            self.pending.appendleft(lease_range)
+            self.requeued += 1
+
+    def handle_request(self, connection_id):
+        '''Returns the message answering a worker's request for work.'''
+        with self.lock:
+            now = time.monotonic()
+            for lease_id in [i for i, lease in self.leases.items() if lease[2] < now]:
+                self._requeue(lease_id)
+
+            if self.pending:
+                lease_range = self.pending.popleft()
+                lease_id = self.next_lease_id
+                self.next_lease_id += 1
+                self.leases[lease_id] = (lease_range, connection_id, now + self.lease_timeout)
+                boxes_per_row, start, stop = lease_range
+                return {'type': 'lease', 'lease_id': lease_id, 'boxes_per_row': boxes_per_row,
+                    'seed': self.seed, 'start': start, 'stop': stop}
+
+            if len(self.done_ranges) < self.total_ranges:
+                return {'type': 'wait'}
+
+            return {'type': 'done'}
+
+    def handle_result(self, lease_id, aggregate):
+        '''Merges the aggregate a worker sent back for a lease.'''
+        with self.lock:
+            lease = self.leases.pop(lease_id, None)
+            if lease is None:
+                # The lease timed out and its range was put back in the queue,
+                # so this late result is ignored in favour of the new lease.
+                return
+            lease_range = lease[0]
+            if lease_range in self.done_ranges:
+                return
+
+            self.done_ranges.add(lease_range)
+            merge_aggregates(self.results[lease_range[0]], aggregate)
+
+            if len(self.done_ranges) == self.total_ranges:
+                self.finished.set()
+
+    def handle_disconnect(self, connection_id):
+        '''Re-queues every lease held by a connection which has closed.'''
+        with self.lock:
+            for lease_id in [i for i, lease in self.leases.items() if lease[1] == connection_id]:
+                self._requeue(lease_id)
+
+    def serve(self, host, port):
+        '''Starts listening for workers in a background thread. Returns the server,
+        whose server_address gives the port actually used if port was 0.'''
+        coordinator = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                connection_id = id(self)
+                try:
+                    for line in self.rfile:
+                        message = json.loads(line)
+                        if message['type'] == 'request':
+                            reply = coordinator.handle_request(connection_id)
+                            self.wfile.write((json.dumps(reply) + '\n').encode())
+                        elif message['type'] == 'result':
+                            coordinator.handle_result(message['lease_id'], message['aggregate'])
+                except (ConnectionError, ValueError):
+                    pass
+                finally:
+                    coordinator.handle_disconnect(connection_id)
+
+        server = socketserver.ThreadingTCPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+def run_worker(host, port, fail_after=None):
+    '''Connects to a coordinator and plays leased ranges of games until told
+    there are none left. If fail_after is given, the worker exits abruptly after
+    finishing that many leases, while holding the next one, to test recovery.'''
+    sock = socket.create_connection((host, port))
+    reader = sock.makefile('r')
+    writer = sock.makefile('w')
+
+    def send(message):
+        writer.write(json.dumps(message) + '\n')
+        writer.flush()
+
+    leases_done = 0
+
+    while True:
+        send({'type': 'request'})
+        line = reader.readline()
+        if not line:
+            break
+        message = json.loads(line)
+
+        if message['type'] == 'done':
+            break
+        if message['type'] == 'wait':
+            time.sleep(0.05)
+            continue
+
+        if fail_after is not None and leases_done >= fail_after:
+            os._exit(1)
+
+        aggregate = play_range(message['boxes_per_row'], message['seed'],
+            message['start'], message['stop'])
+        send({'type': 'result', 'lease_id': message['lease_id'], 'aggregate': aggregate})
+        leases_done += 1
+
+    sock.close()
+
+def run_on_localhost(jobs, seed, workers, lease_size=100, lease_timeout=60.0, crashing_workers=0):
+    '''Runs a coordinator and the given number of worker processes on this machine.
+    The first crashing_workers workers exit after their first lease, so at least one
+    worker must not crash. Returns the coordinator once every range is finished, and
+    raises RuntimeError if every worker exits before then.'''
+    if crashing_workers >= workers:
+        raise ValueError('{} of {} workers would crash, leaving none to finish the games'.format(
+            crashing_workers, workers))
+
+    coordinator = Coordinator(jobs, seed, lease_size, lease_timeout)
+    server = coordinator.serve('127.0.0.1', 0)
+    host, port = server.server_address
+
+    processes = []
+    for i in range(workers):
+        fail_after = None
+        if i < crashing_workers:
+            fail_after = 1
+        process = multiprocessing.Process(target=run_worker, args=(host, port, fail_after))
+        process.start()
+        processes.append(process)
+
+    # Checks every second that some worker is still running, since
+    # otherwise nothing is left to finish the games.
+    while not coordinator.finished.wait(1.0):
+        if not any(process.is_alive() for process in processes):
+            server.shutdown()
+            server.server_close()
+            raise RuntimeError('every worker exited before the games were finished')
+
+    for process in processes:
+        process.join()
+
+    server.shutdown()
+    server.server_close()
+
+    return coordinator
+
+def format_results(results):
+    '''Returns the summary of each board size's aggregate as a formatted string.'''
+    output = ''
+    for boxes_per_row in sorted(results):
+        output += '\nBoard with {} boxes per row:'.format(boxes_per_row)
+        output += format_summary(summarize_aggregate(results[boxes_per_row]))
+    return output
+
+def main():
+    parser = argparse.ArgumentParser(description='Plays games of Winning Player against '
+        'Random Player spread across worker processes, possibly on several hosts.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_job_arguments(subparser):
+        subparser.add_argument('--boxes-per-row', type=int, nargs='+', default=[4],
+            help='board sizes to play (default: 4)')
+        subparser.add_argument('--rounds', type=int, default=1000,
+            help='number of games to play for each board size (default: 1000)')
+        subparser.add_argument('--seed', type=int, default=0,
+            help='random seed (default: 0)')
+        subparser.add_argument('--lease-size', type=int, default=100,
+            help='number of games handed to a worker at a time (default: 100)')
+        subparser.add_argument('--lease-timeout', type=float, default=60.0,
+            help='seconds before an unfinished lease is handed to another worker (default: 60)')
+
+    coordinator_parser = subparsers.add_parser('coordinator', help='hand out games to workers')
+    add_job_arguments(coordinator_parser)
+    coordinator_parser.add_argument('--host', default='0.0.0.0')
+    coordinator_parser.add_argument('--port', type=int, default=5757)
+
+    worker_parser = subparsers.add_parser('worker', help='play games for a coordinator')
+    worker_parser.add_argument('--host', default='127.0.0.1')
+    worker_parser.add_argument('--port', type=int, default=5757)
+
+    local_parser = subparsers.add_parser('local',
+        help='run a coordinator and workers on this machine and check against a single process')
+    add_job_arguments(local_parser)
+    local_parser.add_argument('--workers', type=int, default=4)
+    local_parser.add_argument('--crashing-workers', type=int, default=0,
+        help='number of workers which exit abruptly after their first lease (default: 0)')
+
+    args = parser.parse_args()
+
+    if args.command == 'local' and args.crashing_workers >= args.workers:
+        parser.error('--crashing-workers must be less than --workers')
+
+    if args.command == 'worker':
+        run_worker(args.host, args.port)
+        return
+
+    jobs = [(boxes_per_row, args.rounds) for boxes_per_row in args.boxes_per_row]
+
+    if args.command == 'coordinator':
+        coordinator = Coordinator(jobs, args.seed, args.lease_size, args.lease_timeout)
+        server = coordinator.serve(args.host, args.port)
+        coordinator.finished.wait()
+        # Gives connected workers a moment to be told there is nothing left.
+        time.sleep(1)
+        server.shutdown()
+        server.server_close()
+        print(format_results(coordinator.results))
+        return
+
+    start = time.perf_counter()
+    coordinator = run_on_localhost(jobs, args.seed, args.workers, args.lease_size,
+        args.lease_timeout, args.crashing_workers)
+    distributed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = run_single_process(jobs, args.seed, args.lease_size)
+    single_time = time.perf_counter() - start
+
+    print(format_results(coordinator.results))
+    print('Leases re-queued: {}'.format(coordinator.requeued))
+    print('Distributed time: {:.2f} s, single process time: {:.2f} s'.format(
+        distributed_time, single_time))
+    if coordinator.results == expected:
+        print('Results are identical to a single-process run.')
+    else:
+        print('Results DIFFER from a single-process run.')
+
+if __name__ == '__main__':
+    main()
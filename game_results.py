@@ -0,0 +1,281 @@
+import sqlite3
+import statistics
+import time
+from fractions import Fraction
+
+# Summaries and aggregates of game results, and the database they are stored in.
+# Results are the tuples returned by honors2.Game.play_game_without_output(). Nothing
+# here plays games, so both honors2 and the tools built on it can import this module.
+
+# Name under which games of Winning Player (player 0) against Random Player
+# (player 1) are stored. Other matchups can be stored under their own names.
+WINNING_VS_RANDOM = 'winning-vs-random'
+
+# One row per run of games, and one row per game. The board size, seed and matchup
+# are repeated in every game row so that games can be filtered without a join.
+#
+#  seed            - the seed random was seeded with for the run, if any.
+#  game_number     - the order the games of the run were played in.
+#  starting_player - 0 if player 0 moved first and 1 if player 1 did.
+#  rounds          - number of moves made in the game.
+#  winner          - 0 if player 0 won, 1 if player 1 won and 2 if it was a tie.
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    boxes_per_row INTEGER NOT NULL,
+    seed INTEGER,
+    matchup TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS games (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    game_number INTEGER NOT NULL,
+    boxes_per_row INTEGER NOT NULL,
+    seed INTEGER,
+    matchup TEXT NOT NULL,
+    starting_player INTEGER NOT NULL,
+    rounds INTEGER NOT NULL,
+    score_1 INTEGER NOT NULL,
+    score_2 INTEGER NOT NULL,
+    winner INTEGER NOT NULL,
+    PRIMARY KEY (run_id, game_number)
+);
+
+-- Summary queries filter on board size and matchup and group by scores and winner,
+-- so this index covers them in a single ordered scan without reading the table.
+CREATE INDEX IF NOT EXISTS games_summary ON games
+    (boxes_per_row, matchup, score_1, score_2, winner, rounds);
+CREATE INDEX IF NOT EXISTS games_by_seed ON games (seed);
+'''
+
+class StartingPlayerRecorder:
+    '''Recorder for Game.play_game_without_output() which notes which player
+    made the first move of each game, in the order the games were played.'''
+
+    def __init__(self):
+        self.starting_players = []
+
+        # Whether the next move recorded is the first of a game.
+        self.new_game = True
+
+    def record_move(self, game, player, move):
+        if self.new_game:
+            self.starting_players.append(player)
+            self.new_game = False
+
+    def record_outcome(self, game, outcome):
+        self.new_game = True
+
+class ResultsStore:
+    '''Stores the results of games in an SQLite database at path. Games are
+    buffered and inserted batch_size at a time, each batch in one transaction.'''
+
+    def __init__(self, path='results.db', batch_size=10000):
+        self.batch_size = batch_size
+
+        # Autocommit mode, so that transactions are only the ones begun below.
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.executescript(SCHEMA)
+
+        # Game rows waiting to be inserted.
+        self.pending = []
+
+    def start_run(self, boxes_per_row, seed, matchup=WINNING_VS_RANDOM):
+        '''Adds a run and returns its id, used to add its games.'''
+        cursor = self.connection.execute(
+            'INSERT INTO runs (created, boxes_per_row, seed, matchup) VALUES (?, ?, ?, ?)',
+            (time.time(), boxes_per_row, seed, matchup))
+        return cursor.lastrowid
+
+    def add_game(self, run_id, game_number, boxes_per_row, seed, matchup, starting_player, result):
+        '''Adds a game, where result is a tuple returned by Game.play_game_without_output().
+        Only the first four members are stored, so results which also say whether the
+        game was stopped early (see stop_when_decided) can be added as well.'''
+        rounds, score_1, score_2, winner = result[:4]
+        self.pending.append( (run_id, game_number, boxes_per_row, seed, matchup,
+            starting_player, rounds, score_1, score_2, winner) )
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def add_run(self, boxes_per_row, seed, results, starting_players, matchup=WINNING_VS_RANDOM):
+        '''Adds a run with a list of results and the matching list of starting
+        players, then writes them. Returns the run id.'''
+        run_id = self.start_run(boxes_per_row, seed, matchup)
+        for game_number, (result, starting_player) in enumerate(zip(results, starting_players)):
+            self.add_game(run_id, game_number, boxes_per_row, seed, matchup, starting_player, result)
+        self.flush()
+        return run_id
+
+    def flush(self):
+        '''Inserts every buffered game in a single transaction.'''
+        if not self.pending:
+            return
+        self.connection.execute('BEGIN')
+        try:
+            self.connection.executemany(
+                'INSERT INTO games VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', self.pending)
+        except:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+        self.pending = []
+
+    def query_aggregate(self, boxes_per_row, matchup=WINNING_VS_RANDOM, seed=None, run_id=None):
+        '''Returns an aggregate (see new_aggregate()) of every stored game
+        matching the given board size and matchup, and the seed and run if given.
+        The counts are computed in SQL, grouped so that one row per distinct
+        final score and winner comes back however many games are stored.'''
+        conditions = 'boxes_per_row = ? AND matchup = ?'
+        parameters = [boxes_per_row, matchup]
+        if seed is not None:
+            conditions += ' AND seed = ?'
+            parameters.append(seed)
+        if run_id is not None:
+            conditions += ' AND run_id = ?'
+            parameters.append(run_id)
+
+        aggregate = new_aggregate()
+
+        for score_1, score_2, winner, games, rounds in self.connection.execute(
+                'SELECT score_1, score_2, winner, COUNT(*), SUM(rounds) FROM games WHERE ' +
+                conditions + ' GROUP BY score_1, score_2, winner', parameters):
+            aggregate['games'] += games
+            aggregate['rounds'] += rounds
+            aggregate['wins'][winner] += games
+            for key, score in [('scores_1', score_1), ('scores_2', score_2)]:
+                aggregate[key][str(score)] = aggregate[key].get(str(score), 0) + games
+
+        return aggregate
+
+    def close(self):
+        '''Writes any buffered games and closes the database.'''
+        self.flush()
+        self.connection.close()
+
+def summarize_results(results):
+    '''Takes a list of results returned by Game.play_game_without_output() and
+    returns a dictionary of the statistics reported by honors2.main().'''
+    wins = [0, 0, 0]
+    for result in results:
+        wins[result[3]] += 1
+
+    return {
+        'total_rounds': sum([i[0] for i in results]),
+        'average_1': statistics.mean([i[1] for i in results]),
+        'average_2': statistics.mean([i[2] for i in results]),
+        'median_1': statistics.median([i[1] for i in results]),
+        'median_2': statistics.median([i[2] for i in results]),
+        'highest_1': max([i[1] for i in results]),
+        'highest_2': max([i[2] for i in results]),
+        'lowest_1': min([i[1] for i in results]),
+        'lowest_2': min([i[2] for i in results]),
+        'wins': wins,
+    }
+
+def new_aggregate():
+    '''Returns an empty aggregate of game results. Unlike a list of results,
+    aggregates stay the same size however many games they count and can be
+    merged, so results can be collected in pieces.'''
+    return {
+        'games': 0,
+        'rounds': 0,
+        'wins': [0, 0, 0],
+        # Number of games in which each player finished with each score.
+        # Keys are strings so that aggregates can be sent as JSON.
+        'scores_1': {},
+        'scores_2': {},
+    }
+
+def add_result(aggregate, result):
+    '''Adds a result returned by Game.play_game_without_output() to aggregate.'''
+    aggregate['games'] += 1
+    aggregate['rounds'] += result[0]
+    aggregate['wins'][result[3]] += 1
+    for key, score in [('scores_1', result[1]), ('scores_2', result[2])]:
+        aggregate[key][str(score)] = aggregate[key].get(str(score), 0) + 1
+
+def merge_aggregates(aggregate, other):
+    '''Adds every result counted in other to aggregate.'''
+    aggregate['games'] += other['games']
+    aggregate['rounds'] += other['rounds']
+    for i in range(3):
+        aggregate['wins'][i] += other['wins'][i]
+    for key in ['scores_1', 'scores_2']:
+        for score, count in other[key].items():
+            aggregate[key][score] = aggregate[key].get(score, 0) + count
+
+def _get_histogram_mean(histogram, n):
+    '''Returns the mean of the scores in histogram the same way statistics.mean()
+    would for the list of scores: an int if it is whole and a float otherwise.'''
+    mean = Fraction(sum(int(score) * count for score, count in histogram.items()), n)
+    if mean.denominator == 1:
+        return mean.numerator
+    return float(mean)
+
+def _get_histogram_median(histogram, n):
+    '''Returns the median of the scores in histogram the same way statistics.median()
+    would for the list of scores.'''
+    def get_score(position):
+        seen = 0
+        for score in sorted(histogram, key=int):
+            seen += histogram[score]
+            if seen > position:
+                return int(score)
+
+    if n % 2 == 1:
+        return get_score(n // 2)
+    return (get_score(n // 2 - 1) + get_score(n // 2)) / 2
+
+def summarize_aggregate(aggregate):
+    '''Returns the same dictionary of statistics as summarize_results()
+    would for the results counted in aggregate.'''
+    n = aggregate['games']
+    scores_1 = aggregate['scores_1']
+    scores_2 = aggregate['scores_2']
+
+    return {
+        'total_rounds': aggregate['rounds'],
+        'average_1': _get_histogram_mean(scores_1, n),
+        'average_2': _get_histogram_mean(scores_2, n),
+        'median_1': _get_histogram_median(scores_1, n),
+        'median_2': _get_histogram_median(scores_2, n),
+        'highest_1': max(int(score) for score in scores_1),
+        'highest_2': max(int(score) for score in scores_2),
+        'lowest_1': min(int(score) for score in scores_1),
+        'lowest_2': min(int(score) for score in scores_2),
+        'wins': list(aggregate['wins']),
+    }
+
+def format_summary(summary):
+    '''Takes a dictionary of statistics from summarize_results() and
+    returns them as the formatted string written to multiple_play.txt.'''
+    return '''
+Total number of rounds played: {}
+Winning Player average: {}
+Random Player average: {}
+Winning Player median: {}
+Random Player median: {}
+Winning Player highest score: {}
+Random Player highest score: {}
+Winning Player lowest score: {}
+Random Player lowest score: {}
+Winning Player total wins: {}
+Random Player total wins: {}
+Ties: {}
+'''.format(
+    summary['total_rounds'],
+    summary['average_1'],
+    summary['average_2'],
+    summary['median_1'],
+    summary['median_2'],
+    summary['highest_1'],
+    summary['highest_2'],
+    summary['lowest_1'],
+    summary['lowest_2'],
+    summary['wins'][0],
+    summary['wins'][1],
+    summary['wins'][2]
+)
@@ -234,14 +234,25 @@ class Game:
 
         return self.move(player, move)
 
-    def play_game_with_no_output_no_input(self):
+    def play_game_with_no_output_no_input(self, stop_when_decided=False):
         '''Plays the game without actual players, with each move being
-        determined by random number generation. Returns data about the game.'''
+        determined by random number generation. Returns data about the game.
+
+        If stop_when_decided is True, the game stops as soon as one player has
+        more than half the tiles, and a fifth member is added to the returned data:
+        True if the game was stopped before every tile was taken and False otherwise.'''
         active_player = random.randint(0, 1)
 
         rounds = 0
 
+        truncated = False
+
         while sum(self.score) < self.total_tiles:
+            # Once a player has more than half the tiles, the other cannot catch up.
+            if stop_when_decided and 2 * max(self.score) > self.total_tiles:
+                truncated = True
+                break
+
             rounds += 1
 
             result = self.random_play(active_player)
@@ -252,11 +263,15 @@ class Game:
                     active_player = 1
 
         if self.score[0] > self.score[1]:
-            return rounds, self.score[0], self.score[1], 0
+            outcome = 0
         elif self.score[1] > self.score[0]:
-            return rounds, self.score[0], self.score[1], 1
+            outcome = 1
         else:
-            return rounds, self.score[0], self.score[1], 2
+            outcome = 2
+
+        if stop_when_decided:
+            return rounds, self.score[0], self.score[1], outcome, truncated
+        return rounds, self.score[0], self.score[1], outcome
         
 
 
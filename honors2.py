@@ -1,11 +1,46 @@
+import array
+import bisect
+import collections
 import random
 import statistics
+import sys
+
+from game_results import ResultsStore, StartingPlayerRecorder, format_summary, summarize_results
+
+# A move made during a game, as yielded by Game.play_events():
+#
+#  player         - the player who made the move (0 for player A, 1 for player B).
+#  move           - the move as passed to Game.move(), a string of two dots.
+#  edge           - the move as an (i, j) pair of dots where i < j, or None if
+#                   the move could not be read.
+#  result         - the value Game.move() returned for the move.
+#  boxes_captured - the number of boxes the move closed.
+#  score          - both players' scores after the move, as a tuple.
+MoveEvent = collections.namedtuple('MoveEvent',
+    ['player', 'move', 'edge', 'result', 'boxes_captured', 'score'])
+
+class AdjacencyRow(dict):
+    '''A row of Game.am, which only holds the dots the row's dot is adjacent to.'''
+
+    def __missing__(self, j):
+        # Dots which are not adjacent.
+        return 0
 
 class Game:
-    def __init__(self, boxes_per_row):
+    def __init__(self, boxes_per_row, topology=None):
+        '''Sets up an empty board with boxes_per_row boxes per row. The board's edge
+        and box tables are read from topology, a topology.Topology for the board size,
+        if one is given, and are otherwise worked out from scratch.'''
         self.boxes_per_row = boxes_per_row
         self.total_boxes = boxes_per_row ** 2
 
+        if topology is not None and topology.boxes_per_row != boxes_per_row:
+            raise ValueError('topology is for a board with {} boxes per row, not {}'.format(
+                topology.boxes_per_row, boxes_per_row))
+
+        # Precomputed tables for the board, or None.
+        self.topology = topology
+
         # List representing the game board.
         # Each position can contain one of the following values:
         # -1 - implies that the box has not been filled.
@@ -18,19 +53,6 @@ class Game:
         # position 1 contains player 2's points.
         self.score = [0, 0]
 
-        # Adjacency matrix for the board (because
-        # this matrix is symmetrical, only the upper right half is used).
-        # Represented as a n x n list of lists, where n is the number of
-        # dots per row on the board. Each postion (i, j) can contain
-        # one of the following values:
-        #
-        #  0 - implies that a move cannot be made between dots i and j
-        #      because they are not adjacent.
-        #  1 - implies that a move can be made between dots i and j.
-        #  2 - mplies that a move had already been made between dots i and j.
-        self.am = []
-
-        
         n = boxes_per_row + 1
         v = n ** 2
 
@@ -40,26 +62,245 @@ class Game:
         # Total number of dots on the board.
         self.total_dots = v
 
+        # Every edge on the board, as (i, j) pairs of dots where i < j, in order.
+        # The position of an edge in this list is its edge id.
+        if topology is not None:
+            self.edges = topology.edges
+        else:
+            self.edges = []
+            for i in range(v):
+                # Dots along the right side of the board have no dot to their right.
+                if i % n != n - 1:
+                    self.edges.append( (i, i+1) )
+                # Dots along the bottom of the board have no dot underneath them.
+                if i + n < v:
+                    self.edges.append( (i, i+n) )
+
         # Keeps track of which moves are available
         # for random_play() to make.
-        self.valid_moves = []
+        self.valid_moves = list(self.edges)
 
-        # This constructs the adjacency matrix
-        # and the list of valid moves.
-        for i in range(v):
-            r = [] # new row in adjacency matrix.
-            for j in range(v):
-                if (j == i + 1 and i % n != n - 1) or j == i + n:
-                    # Adds a 1 in the position (i, j) in the adjacency matrix
-                    # to represent that dots i and j are adjacent.
-                    r.append(1)
-                    # Adds the move between dots i and j to the list of valid moves.
-                    self.valid_moves.append( (i, j) )
-                else:
-                    # Adds a 0 in the position (i, j) in the adjacency matrix
-                    # to represent that dots i and j are not adjacent.
-                    r.append(0)
-            self.am.append(r)
+        # Adjacency matrix for the board (because
+        # this matrix is symmetrical, only the upper right half is used).
+        # Represented as a list of n rows, where n is the number of dots on
+        # the board. Each postion (i, j) can contain one of the following values:
+        #
+        #  0 - implies that a move cannot be made between dots i and j
+        #      because they are not adjacent.
+        #  1 - implies that a move can be made between dots i and j.
+        #  2 - mplies that a move had already been made between dots i and j.
+        #
+        # Each row only stores the dots to the right of and underneath its dot and
+        # reads as 0 everywhere else (see AdjacencyRow), since a full n x n matrix
+        # takes far too long to build and too much memory to hold on large boards.
+        self.am = [AdjacencyRow() for _ in range(v)]
+        for i, j in self.edges:
+            self.am[i][j] = 1
+
+        # Maps each edge (i, j) to its edge id.
+        #
+        # For each edge id, edge_boxes holds a tuple of the boxes (by position on the
+        # board) which that edge is a side of. Edges along the border of the board
+        # belong to one box while all other edges belong to two.
+        #
+        # For each box, box_edges holds a tuple of the ids of its four sides.
+        if topology is not None:
+            self.edge_ids = topology.edge_ids
+            self.edge_boxes = topology.edge_boxes
+            self.box_edges = topology.box_edges
+        else:
+            self.edge_ids = dict(zip(self.edges, range(len(self.edges))))
+            self.edge_boxes = []
+            self.box_edges = []
+
+            for i in range(v):
+                # Dots along the right side and bottom of the board do not have a box to their
+                # lower right.
+                if i % n == n - 1 or i >= n * (n - 1):
+                    continue
+                self.box_edges.append( (self.edge_ids[(i, i+1)], self.edge_ids[(i, i+n)],
+                    self.edge_ids[(i+1, i+n+1)], self.edge_ids[(i+n, i+n+1)]) )
+
+            for edge in self.edges:
+                self.edge_boxes.append(tuple(self._get_boxes_of_edge(*edge)))
+
+        # Bitboards describing the board. Each bitboard is an integer in which
+        # bit k is set if the thing at position k is present. Positions are laid out
+        # by dot number so that neighbouring edges and boxes are a fixed shift apart:
+        #
+        #  - The edge between dots i and i+1 is at bit i.
+        #  - The edge between dots i and i+n is at bit v + i.
+        #  - The box whose upper left corner is dot i is at bit i.
+        #
+        # This lets strategies answer questions such as "which boxes have three
+        # sides drawn?" or "which moves are safe?" with shifts and popcounts
+        # (see boxes_with_sides() and safe_edges()).
+
+        # The bits of one row of boxes, which are also those of the horizontal edges
+        # in every row of dots. Rows of dots are n bits apart. Building the bitboards
+        # a row rather than a bit at a time keeps this quick on large boards.
+        row = (1 << boxes_per_row) - 1
+
+        # Every box on the board.
+        self.all_boxes = 0
+        for r in range(boxes_per_row):
+            self.all_boxes |= row << (r * n)
+
+        # Every edge on the board: the horizontal edges of every row of dots, and
+        # the vertical edges below every dot but those of the bottom row.
+        self.all_edges = ((1 << (v - n)) - 1) << v
+        for r in range(n):
+            self.all_edges |= row << (r * n)
+
+        # Edges which have been drawn.
+        self.drawn_edges = 0
+
+        # Number of sides drawn for each box, by position on the board.
+        self.box_sides = [0] * self.total_boxes
+
+        # box_masks[k] contains the boxes which have exactly k sides drawn.
+        self.box_masks = [self.all_boxes, 0, 0, 0, 0]
+
+        # The valid moves split into three classes, kept up to date as moves are made:
+        #
+        #  capturing_moves   - moves which close at least one box.
+        #  sacrificing_moves - moves which close no box but give a box its third side,
+        #                      letting the other player close it.
+        #  safe_moves        - every other valid move.
+        self.capturing_moves = MoveSet()
+        self.sacrificing_moves = MoveSet()
+        self.safe_moves = MoveSet(self.valid_moves)
+
+    def _get_boxes_of_edge(self, i, j):
+        '''Returns the positions on the board of the boxes which the edge
+        between dots i and j is a side of.'''
+        n = self.dots_per_row
+        b = self.boxes_per_row
+
+        boxes = []
+
+        # The edge is horizontal.
+        if j == i + 1:
+            row = i // n
+            column = i % n
+            # Box above the edge.
+            if row > 0:
+                boxes.append((row - 1) * b + column)
+            # Box below the edge.
+            if row < b:
+                boxes.append(row * b + column)
+        # The edge is vertical.
+        else:
+            row = i // n
+            column = i % n
+            # Box to the left of the edge.
+            if column > 0:
+                boxes.append(row * b + column - 1)
+            # Box to the right of the edge.
+            if column < b:
+                boxes.append(row * b + column)
+
+        return boxes
+
+    def _get_box_dot(self, box):
+        '''Returns the dot in the upper left corner of the box at the given
+        position on the board.'''
+        return box + box // self.boxes_per_row
+
+    def edge_bit(self, i, j):
+        '''Returns the position of the edge between dots i and j (where i < j)
+        in an edge bitboard.'''
+        if j == i + 1:
+            return i
+        return self.total_dots + i
+
+    def _record_edge(self, i, j):
+        '''Updates the bitboards after a move has been made between dots i and j.'''
+        self.drawn_edges |= 1 << self.edge_bit(i, j)
+
+        # The move is no longer valid, so it is removed from its move class.
+        self._get_move_class((i, j)).remove( (i, j) )
+
+        boxes = self.edge_boxes[self.edge_ids[(i, j)]]
+
+        for box in boxes:
+            bit = 1 << self._get_box_dot(box)
+            sides = self.box_sides[box]
+
+            # Moves the box from the bitboard of boxes with k sides drawn
+            # to the bitboard of boxes with k + 1 sides drawn.
+            self.box_masks[sides] &= ~bit
+            self.box_masks[sides + 1] |= bit
+            self.box_sides[box] = sides + 1
+
+        # Only the undrawn sides of the boxes touched by the move
+        # can have changed class.
+        for box in boxes:
+            for edge_id in self.box_edges[box]:
+                edge = self.edges[edge_id]
+                if self.am[edge[0]][edge[1]] == 1:
+                    self._classify_move(edge)
+
+    def _get_move_class(self, move):
+        '''Returns whichever of capturing_moves, sacrificing_moves
+        and safe_moves currently contains move.'''
+        if move in self.capturing_moves:
+            return self.capturing_moves
+        elif move in self.sacrificing_moves:
+            return self.sacrificing_moves
+        return self.safe_moves
+
+    def _classify_move(self, move):
+        '''Moves a valid move into the class matching the boxes it is a side of.'''
+        most_sides = 0
+        for box in self.edge_boxes[self.edge_ids[move]]:
+            if self.box_sides[box] > most_sides:
+                most_sides = self.box_sides[box]
+
+        if most_sides == 3:
+            move_class = self.capturing_moves
+        elif most_sides == 2:
+            move_class = self.sacrificing_moves
+        else:
+            move_class = self.safe_moves
+
+        current_class = self._get_move_class(move)
+        if current_class is not move_class:
+            current_class.remove(move)
+            move_class.add(move)
+
+    def boxes_with_sides(self, k):
+        '''Returns a bitboard of the boxes which have exactly k sides drawn.'''
+        return self.box_masks[k]
+
+    def count_boxes_with_sides(self, k):
+        '''Returns the number of boxes which have exactly k sides drawn.'''
+        return bin(self.box_masks[k]).count('1')
+
+    def undrawn_edges(self):
+        '''Returns a bitboard of the edges which have not been drawn yet.'''
+        return self.all_edges & ~self.drawn_edges
+
+    def _edges_of_boxes(self, boxes):
+        '''Takes a bitboard of boxes and returns a bitboard of every side of those boxes.'''
+        n = self.dots_per_row
+
+        # Top and bottom sides.
+        horizontal = boxes | (boxes << n)
+        # Left and right sides.
+        vertical = boxes | (boxes << 1)
+
+        return horizontal | (vertical << self.total_dots)
+
+    def capturing_edges(self):
+        '''Returns a bitboard of the undrawn edges which would close a box.'''
+        return self.undrawn_edges() & self._edges_of_boxes(self.box_masks[3])
+
+    def safe_edges(self):
+        '''Returns a bitboard of the undrawn edges which would not give
+        any box its third or fourth side.'''
+        risky_boxes = self.box_masks[2] | self.box_masks[3]
+        return self.undrawn_edges() & ~self._edges_of_boxes(risky_boxes)
 
     def move(self, player, input):
         '''Takes in a string of two space-seperated integers representing
@@ -104,6 +345,9 @@ class Game:
             # Removes the move between i and j from the list of valid moves.
             self.valid_moves.remove( (i,j) )
 
+            # Updates the bitboards to include the move.
+            self._record_edge(i, j)
+
             # Calls check_for_box() to see if connecting i and j has closed a box.
             if self.check_for_box(player, i, j):
                 return 1 # Returns 1 if a box was closed.
@@ -118,6 +362,121 @@ class Game:
         else:
             return -3
 
+    def load_position(self, edges):
+        '''Draws every edge in edges, an iterable of (i, j) pairs of dots, on a game
+        no moves have been made in. Used to analyze positions whose order of moves is
+        not known, so no points are scored: boxes the edges close are left unowned on
+        the board and the game should not be played on from the position. Raises a
+        ValueError if a pair of dots is not adjacent.'''
+        for a, b in edges:
+            i = min(a, b)
+            j = max(a, b)
+            if self.am[i][j] == 0:
+                raise ValueError('dots {} and {} are not adjacent'.format(a, b))
+            if self.am[i][j] == 1:
+                self.am[i][j] = 2
+                self._record_edge(i, j)
+
+        self.valid_moves = [move for move in self.valid_moves if self.am[move[0]][move[1]] == 1]
+
+    def only_captures_remain(self):
+        '''Returns True if every valid move closes a box. From such a position the
+        player to move never loses the turn, so they take every remaining box
+        whatever order the moves are made in.'''
+        return len(self.capturing_moves) == len(self.valid_moves)
+
+    def get_forced_outcome(self, player):
+        '''Takes the player to move in a position where only captures remain and
+        returns the board and score the game will finish with.'''
+        board = [player if i == -1 else i for i in self.board]
+        score = list(self.score)
+        score[player] += self.board.count(-1)
+        return board, score
+
+    def resolve_forced_captures(self, player):
+        '''Finishes a game in which only captures remain by giving every remaining
+        box to player in one step, instead of making each move and scanning for
+        closed boxes. Returns the number of moves this stands in for.'''
+        moves = len(self.valid_moves)
+
+        self.board, self.score = self.get_forced_outcome(player)
+
+        for i, j in self.valid_moves:
+            self.am[i][j] = 2
+            self._record_edge(i, j)
+        self.valid_moves = []
+
+        return moves
+
+    def undo_move(self, input):
+        '''Takes in a string of two space-seperated integers representing
+        two dots between which the most recent move was made, and takes that
+        move back, including any points it scored. Used to search through possible
+        games without copying the board. Returns an integer representing the
+        outcome of attempting to undo the move:
+
+         0 - The move was undone.
+        -1 - Input was not formatted properly so nothing was undone.
+        -2 - Input designated dots which are not connected so nothing was undone.
+        -3 - Input designated dots which are not adjacent so nothing was undone.
+        '''
+
+        try:
+            a, b = input.split()
+            a = int(a)
+            b = int(b)
+        except:
+            return -1
+
+        if a > b:
+            i = b
+            j = a
+        else:
+            i = a
+            j = b
+
+        if self.am[i][j] == 1:
+            return -2
+        elif self.am[i][j] != 2:
+            return -3
+
+        # Marks dots i and j as no longer connected.
+        self.am[i][j] = 1
+
+        # valid_moves is always kept in the order the moves were first added,
+        # which is sorted order, so the move is inserted back in its original place.
+        bisect.insort(self.valid_moves, (i, j))
+
+        self.drawn_edges &= ~(1 << self.edge_bit(i, j))
+
+        boxes = self.edge_boxes[self.edge_ids[(i, j)]]
+
+        for box in boxes:
+            sides = self.box_sides[box]
+
+            # A box with four sides was closed by this move, so the point scored for
+            # it is taken back. Boxes closed by load_position() belong to nobody.
+            if sides == 4:
+                if self.board[box] != -1:
+                    self.score[self.board[box]] -= 1
+                self.board[box] = -1
+
+            bit = 1 << self._get_box_dot(box)
+            self.box_masks[sides] &= ~bit
+            self.box_masks[sides - 1] |= bit
+            self.box_sides[box] = sides - 1
+
+        # The move is valid again, so it is added back to a move class
+        # along with reclassifying the other sides of the boxes it touches.
+        self.safe_moves.add( (i, j) )
+        for box in boxes:
+            for edge_id in self.box_edges[box]:
+                edge = self.edges[edge_id]
+                if self.am[edge[0]][edge[1]] == 1:
+                    self._classify_move(edge)
+
+        return 0
+
     def check_for_box(self, player, a, b):
         '''Checks each box on the board to determine whether or not
         one or two boxes have been closed by making a connection
@@ -247,7 +606,26 @@ class Game:
 
         return self.move(player, move)
 
-    
+    def greedy_play(self, player, rng=random):
+        '''Closes a box whenever possible, otherwise makes a random safe move,
+        and only gives away a box when no safe move is left.'''
+        move = self.choose_greedy_move(rng)
+        return self.move(player, '{} {}'.format(*move))
+
+    def choose_greedy_move(self, rng=random):
+        '''Returns the move greedy_play() would make, drawing from rng.'''
+
+        if self.capturing_moves:
+            moves = self.capturing_moves
+        elif self.safe_moves:
+            moves = self.safe_moves
+        else:
+            moves = self.sacrificing_moves
+
+        # Selects a move at random from the chosen class.
+        x = rng.randint(0, len(moves) - 1)
+        return moves[x]
+
     def play_with_output(self, starting_player):
         '''Plays a game, pitting Winning Player against Random Player.
         The starting_player variable should be 0 if Winning Player is meant to go
@@ -255,74 +633,171 @@ class Game:
         of the game as a formatted string.'''
 
         winning_player = WinningPlayer(self)
+        random_player = RandomPlayer(self)
 
-        active_player = starting_player
+        events = self.play_events(winning_player, random_player, starting_player)
 
-        output = 'Player {} goes first!\n'.format(self._get_player_name(active_player))
+        return ''.join(self.render_events(starting_player, events))
 
-        output += self.draw_board()
+    def play_events(self, player_a, player_b, starting_player):
+        '''Plays a game, pitting player_a against player_b as play_game_between() does,
+        as a generator which yields a MoveEvent after each move is made. Nothing is
+        played until the events are asked for, and each move is only decided once the
+        previous event has been consumed, so a consumer sees the game exactly as it
+        stands after the move it was given and can stop at any point for free.'''
+
+        active_player = starting_player
 
         # Continues playing until all possible points have been scored.
         while sum(self.score) < self.total_boxes:
-
-            # It is winning player's turn.
             if active_player == 0:
-                output += "Player A's turn!\n"
-                winning_player_move = winning_player.determine_next_move(self)
-                result = self.move(active_player, winning_player_move)
-
-                # If no point was scored, switches active player to the other player
-                if result == 0:
-                    if active_player == 1:
-                        active_player = 0
-                    else:
-                        active_player = 1
-                output += self.draw_board()
-            # It is random player's turn.
+                move = player_a.determine_next_move(self)
             else:
-                output += "Player B's turn!\n"
-                result = self.random_play(active_player)
+                move = player_b.determine_next_move(self)
 
-                # If no point was scored, switches active player to the other player
-                if result == 0:
-                    if active_player == 1:
-                        active_player = 0
-                    else:
-                        active_player = 1
-                output += self.draw_board()
+            score_before = self.score[active_player]
+            result = self.move(active_player, move)
+
+            yield MoveEvent(active_player, move, self._get_edge_of_move(move), result,
+                self.score[active_player] - score_before, (self.score[0], self.score[1]))
+
+            # If no point was scored, switches active player to the other player
+            if result == 0:
+                if active_player == 1:
+                    active_player = 0
+                else:
+                    active_player = 1
 
-        output += 'Game is over, all boxes have been filled\n'
+    def play_events_without_output(self):
+        '''Returns the events of a game of Winning Player against Random Player
+        (see play_events()), with the starting player selected at random. Draws the
+        same random numbers as play_game_without_output(), so the same game is played.'''
+
+        # Player A is Winning Player.
+        winning_player = WinningPlayer(self)
+
+        # The starting player is chosen at random.
+        active_player = random.randint(0, 1)
+
+        # Player B is Random Player.
+        random_player = RandomPlayer(self)
+
+        return self.play_events(winning_player, random_player, active_player)
+
+    def _get_edge_of_move(self, move):
+        '''Returns move, a string of two dots, as an (i, j) pair where i < j,
+        or None if it is not formatted properly.'''
+        try:
+            a, b = move.split()
+            a = int(a)
+            b = int(b)
+        except:
+            return None
+        return (min(a, b), max(a, b))
+
+    def render_events(self, starting_player, events):
+        '''Takes the events of a game being played on this board, and yields the
+        play-by-play returned by play_with_output() a piece at a time as each
+        event arrives, drawing the board as it stands after each move.'''
+
+        yield 'Player {} goes first!\n'.format(self._get_player_name(starting_player))
+
+        yield self.draw_board()
+
+        for event in events:
+            yield "Player {}'s turn!\n".format(self._get_player_name(event.player))
+            yield self.draw_board()
+
+        yield 'Game is over, all boxes have been filled\n'
         if self.score[0] > self.score[1]:
-            output += 'Player A wins!'
+            yield 'Player A wins!'
         elif self.score[1] > self.score[0]:
-            output += 'Player B wins!'
+            yield 'Player B wins!'
         else:
-           output += "It's a tie!"
-
-        return output
+            yield "It's a tie!"
 
-    def play_game_without_output(self):
+    def play_game_without_output(self, recorder=None, fast_forward=False, verify=False,
+            stop_when_decided=False, decision_cache=None):
         '''Plays a game, pitting Winning Player against Random Player.
         The starting_player is selected at random. Data regarding the outcome of
-        the game is returned once the game is finished.'''
+        the game is returned once the game is finished. See play_game_between()
+        for recorder, fast_forward, verify and stop_when_decided. A DecisionCache
+        passed as decision_cache is used by Winning Player, and can be shared by
+        many games on the same board size.'''
 
         # Player A is Winning Player.
-        winning_player = WinningPlayer(self)
+        winning_player = WinningPlayer(self, decision_cache)
 
         # The starting player is chosen at random.
         active_player = random.randint(0, 1)
 
+        # Player B is Random Player.
+        random_player = RandomPlayer(self)
+
+        return self.play_game_between(winning_player, random_player, active_player, recorder,
+            fast_forward, verify, stop_when_decided)
+
+    def play_game_between(self, player_a, player_b, starting_player, recorder=None,
+            fast_forward=False, verify=False, stop_when_decided=False):
+        '''Plays a game, pitting player_a against player_b, each of which can be any
+        object with a determine_next_move() function (such as WinningPlayer or RandomPlayer).
+        The starting_player variable should be 0 if player_a is meant to go first and 1
+        if player_b is meant to go first. Data regarding the outcome of the game is
+        returned once the game is finished.
+
+        If recorder is given, its record_move() function is called with the game,
+        the active player and the chosen move before every move is made, and its
+        record_outcome() function is called with the game and the outcome once the
+        game is finished.
+
+        If fast_forward is True, once every valid move closes a box the remaining
+        boxes are given to the player to move in one step (see resolve_forced_captures()),
+        counting one round per remaining move. Played out, the rounds can come to more,
+        since a player may choose a move which was already made (as Winning Player
+        sometimes does) and be asked again. The remaining moves are never asked of the
+        players or passed to recorder, so random numbers they would have drawn are left
+        for later games. If verify is also True, the game is played out move by move
+        instead and a RuntimeError is raised if it does not finish with the board and
+        score fast-forwarding predicted.
+
+        If stop_when_decided is True, the game stops as soon as one player has closed
+        more than half the boxes, since the other player can no longer catch up, and a
+        fifth member is added to the returned tuple: True if the game was stopped before
+        every box was closed (so the scores are the scores so far) and False otherwise.'''
+
+        active_player = starting_player
+
         # Keeps track of the number of rounds played.
         rounds = 0
 
+        # The board and score fast-forwarding predicted, when verifying.
+        prediction = None
+
+        # Whether the game was stopped once its outcome was decided.
+        truncated = False
+
         # Continues playing until all possible points have been scored.
         while sum(self.score) < self.total_boxes:
+            # Stops once a player has more than half the boxes. A tie can only be
+            # decided by the last box, so it always plays out in full.
+            if stop_when_decided and 2 * max(self.score) > self.total_boxes:
+                truncated = True
+                break
+
+            if fast_forward and prediction is None and self.only_captures_remain():
+                if not verify:
+                    rounds += self.resolve_forced_captures(active_player)
+                    break
+                prediction = self.get_forced_outcome(active_player)
+
             rounds += 1
 
-            # It is winning player's turn.
+            # It is player A's turn.
             if active_player == 0:
-                winning_player_move = winning_player.determine_next_move(self)
-                result = self.move(active_player, winning_player_move)
+                player_a_move = player_a.determine_next_move(self)
+                if recorder is not None:
+                    recorder.record_move(self, active_player, player_a_move)
+                result = self.move(active_player, player_a_move)
 
                 # If no point was scored, switches active player to the other player
                 if result == 0:
@@ -331,9 +806,12 @@ class Game:
                     else:
                         active_player = 1
 
-            # It is random player's turn.
+            # It is player B's turn.
             else:
-                result = self.random_play(active_player)
+                player_b_move = player_b.determine_next_move(self)
+                if recorder is not None:
+                    recorder.record_move(self, active_player, player_b_move)
+                result = self.move(active_player, player_b_move)
 
                 # If no point was scored, switches active player to the other player
                 if result == 0:
@@ -342,16 +820,178 @@ class Game:
                     else:
                         active_player = 1
 
-        # Returns data regarding the outcome of the game.
+        if prediction is not None and prediction != (self.board, self.score):
+            raise RuntimeError('Fast-forwarding predicted board {} and score {} but playing '
+                'move by move gave board {} and score {}'.format(*prediction, self.board, self.score))
+
         # The last member in the returned tuple is a 0 if
-        # Winning Player won, a 1 if Random Player won
+        # player A won, a 1 if player B won
         # and a 2 if it was a tie.
         if self.score[0] > self.score[1]:
-            return rounds, self.score[0], self.score[1], 0
+            outcome = 0
         elif self.score[1] > self.score[0]:
-            return rounds, self.score[0], self.score[1], 1
+            outcome = 1
         else:
-            return rounds, self.score[0], self.score[1], 2
+            outcome = 2
+
+        if recorder is not None:
+            recorder.record_outcome(self, outcome)
+
+        # Returns data regarding the outcome of the game.
+        if stop_when_decided:
+            return rounds, self.score[0], self.score[1], outcome, truncated
+        return rounds, self.score[0], self.score[1], outcome
+
+class CacheGroup:
+    '''The lookups DecisionCache has made for positions with one number of valid
+    moves left, used to decide whether looking them up is worth it.'''
+
+    def __init__(self, trial_lookups):
+        # Lookups and hits in the current trial.
+        self.lookups = 0
+        self.hits = 0
+
+        # Decisions left to make without the cache before the next trial.
+        self.skip_left = 0
+
+        # Decisions to skip after the next failed trial.
+        self.next_skip = trial_lookups
+
+class DecisionCache:
+    '''Cache of the moves Winning Player has decided on, which can be shared by every
+    Winning Player on one board size (see WinningPlayer) so that positions which come up
+    again, in the same game or in later ones, are answered without working the move out again.
+    Entries are kept until their estimated size would pass max_bytes, after which the
+    least recently used are evicted. Counts hits, misses and evictions.
+
+    Working a move out only takes a few microseconds, so the cache is only of any use
+    on tiny boards, where games keep reaching the same positions. Even on 2x2 boards it
+    only saves about a fifth of the time Winning Player spends deciding, a few percent
+    of a whole game. From 3x3 up positions rarely come up again (2% of lookups hit on
+    6x6 boards) and games take as long with it as without, or longer.
+
+    A lookup which misses costs more than working the move out, and past the opening
+    positions rarely come up again. So positions are grouped by the number of valid
+    moves left and each group is looked up in trials of trial_lookups lookups. If fewer
+    than min_hit_rate of a trial's lookups can still be hits, the group's moves are worked out
+    without the cache for as many decisions as the last time, doubled (starting from
+    trial_lookups and up to MAX_SKIP_TRIALS trials' worth), before it is tried again.
+    Groups which never come up again are skipped nearly all the time, while the moves
+    stored during each trial let a group which comes up often enough pass a later trial.'''
+
+    # Estimated bytes used by each entry besides the two bitboards in its key: the
+    # key and value tuples, the move string, the dictionary slot and the node ordering
+    # the entries. Measured with tracemalloc on boards from 2x2 to 12x12.
+    ENTRY_OVERHEAD = 440
+
+    # Estimated bytes added to an entry by each box which became set up or closable.
+    BOX_OVERHEAD = 40
+
+    # Most decisions a group is skipped for after a failed trial, in trials.
+    MAX_SKIP_TRIALS = 256
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, min_hit_rate=0.5, trial_lookups=16):
+        self.max_bytes = max_bytes
+        self.min_hit_rate = min_hit_rate
+        self.trial_lookups = trial_lookups
+
+        # Size of the board the cached moves are for, set by the first player using the
+        # cache. Positions are stored as bitboards, which mean different things on
+        # different board sizes.
+        self.boxes_per_row = None
+
+        # Maps each key to a (value, size) pair, least recently used first.
+        self.entries = collections.OrderedDict()
+
+        # Estimated bytes used by every entry.
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Number of decisions made without the cache because their group was skipped.
+        self.skipped = 0
+
+        # Maps each number of moves left to its CacheGroup.
+        self.groups = {}
+
+    def is_skipped(self, moves_left):
+        '''Returns True if positions with moves_left valid moves are currently
+        being skipped, and counts the decision as skipped.'''
+        group = self.groups.get(moves_left)
+        if group is None or group.skip_left == 0:
+            return False
+        group.skip_left -= 1
+        self.skipped += 1
+        return True
+
+    def get(self, key, moves_left):
+        '''Returns the value stored for key, a position with moves_left valid moves,
+        and marks it as the most recently used, or returns None if nothing is stored.'''
+        entry = self.entries.get(key)
+
+        group = self.groups.get(moves_left)
+        if group is None:
+            group = CacheGroup(self.trial_lookups)
+            self.groups[moves_left] = group
+        group.lookups += 1
+        if entry is not None:
+            group.hits += 1
+        # A trial fails as soon as it has missed too often to reach min_hit_rate, so
+        # groups which never come up again cost as few misses as possible.
+        if group.lookups - group.hits > (1 - self.min_hit_rate) * self.trial_lookups:
+            group.skip_left = group.next_skip
+            group.next_skip = min(2 * group.next_skip, self.MAX_SKIP_TRIALS * self.trial_lookups)
+            group.lookups = 0
+            group.hits = 0
+        elif group.lookups == self.trial_lookups:
+            group.next_skip = self.trial_lookups
+            group.lookups = 0
+            group.hits = 0
+
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value):
+        '''Stores value for key, evicting the least recently used entries
+        until the cache fits in max_bytes again. The key and value are laid out
+        as in WinningPlayer.determine_next_move().'''
+        size = (self.ENTRY_OVERHEAD + 2 * sys.getsizeof(key[0]) +
+            self.BOX_OVERHEAD * (len(value[3]) + len(value[4])))
+        if size > self.max_bytes:
+            return
+
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[1]
+
+        self.entries[key] = (value, size)
+        self.bytes += size
+
+        while self.bytes > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+    def hit_rate(self):
+        '''Returns the fraction of lookups which found a stored move.'''
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+    def format_stats(self):
+        '''Returns the cache's size, hit rate, evictions and skipped decisions
+        as a formatted string.'''
+        return ('Decision cache: {} entries ({:.1f} of {:.1f} MB), {} hits, {} misses '
+            '(hit rate {:.1%}), {} evictions, {} decisions skipped').format(
+            len(self.entries), self.bytes / 2**20, self.max_bytes / 2**20, self.hits,
+            self.misses, self.hit_rate(), self.evictions, self.skipped)
 
 class WinningPlayer:
     '''Class designed to store all relevant information about a game in order for
@@ -359,18 +999,52 @@ class WinningPlayer:
     than Random Player's. Also provides a function which returns the best possible
     move given the current condition of the board.'''
 
-    def __init__(self, game):
+    def __init__(self, game, cache=None):
         '''Using the game which is about to played, sets up an ordered list of
-        moves which should be made in order, and makes a list of every box on the board
-        (see Box class).'''
+        moves which should be made in order, and records how every box on the board
+        should be treated. If a DecisionCache is given, moves are looked up in it
+        before being worked out, and stored in it once they have been.'''
 
         # A list of moves which WinningPlayer is meant to make in order.
         # Doing so establishes the longest possible chain of boxes for the board.
         self.ordered_moves = []
 
+        # Position in ordered_moves before which every move has already been made.
+        # Moves only ever stop being valid, so this never needs to move backwards.
+        self.next_ordered_move = 0
+
         # Keeps track of how each box should be treated, i.e. under what condtions
-        # should Winning Player close the box.
-        self.boxes = []
+        # should Winning Player close the box. Each box's state is kept in parallel
+        # arrays indexed by box number, rather than in an object per box:
+        #
+        #  setup_moves   - edge ids of the two moves which should be made in order to
+        #                  set the box up for Random Player to make it closable, at
+        #                  positions 2 * box and 2 * box + 1.
+        #  closing_moves - edge ids of two moves, either of which must be made after
+        #                  Random Player has made the box closable, laid out the same way.
+        #  setup         - 1 once both setup moves have been made.
+        #  closable      - 1 once the box is set up and one closing move has been made
+        #                  (i.e. three of its sides are connected).
+        #  final_move    - edge id of the move which closes the box once it is closable,
+        #                  or -1 before then.
+        self.setup_moves = array.array('i')
+        self.closing_moves = array.array('i')
+        self.setup = bytearray(game.total_boxes)
+        self.closable = bytearray(game.total_boxes)
+        self.final_move = array.array('i', [-1]) * game.total_boxes
+
+        # Game.drawn_edges as of the last time the boxes were checked. Only boxes
+        # with a side drawn since then can have become set up or closable.
+        self.drawn_edges = 0
+
+        # DecisionCache shared with other players, or None if every move is worked out.
+        self.cache = cache
+        if cache is not None:
+            if cache.boxes_per_row is None:
+                cache.boxes_per_row = game.boxes_per_row
+            elif cache.boxes_per_row != game.boxes_per_row:
+                raise ValueError('decision cache is for a board with {} boxes per row, not {}'.format(
+                    cache.boxes_per_row, game.boxes_per_row))
 
         # Indicates whether or not the next move to be made is consecutive,
         # i.e. if a point was just scored.
@@ -387,6 +1061,17 @@ class WinningPlayer:
         # Direction the chain is being traversed. False for backwards, True for forwards.
         self.chain_traversal_direction = None
 
+        if game.topology is not None:
+            # The plan has already been worked out and written to a topology file.
+            self.ordered_moves = game.topology.ordered_moves
+            self.setup_moves = game.topology.setup_moves
+            self.closing_moves = game.topology.closing_moves
+        else:
+            self._make_plan(game)
+
+    def _make_plan(self, game):
+        '''Sets up ordered_moves and how each box should be treated.'''
+
         n = game.dots_per_row
 
         # Establishes a run of moves along the top row of dots
@@ -454,96 +1139,200 @@ class WinningPlayer:
                 pass
             # Upper right box.
             elif i == n - 2:
-                self.boxes.append(Box( ((i, i+1), (i+1, i+n+1)), ((i, i+n), (i+n, i+n+1)) ))
+                self._add_box(game, ((i, i+1), (i+1, i+n+1)), ((i, i+n), (i+n, i+n+1)))
             
             # Any box along the left side of the board which is the bottom of a curve in the chain.
             elif i % (n*2) == n:
-                self.boxes.append(Box( ((i, i+n), (i+n, i+n+1)), ( (i, i+1), (i+1, i+n+1)) ))
+                self._add_box(game, ((i, i+n), (i+n, i+n+1)), ( (i, i+1), (i+1, i+n+1)))
             
             # Any box along the right side of the board which is the top of a curve in the chain.
             elif i % (n*2) == 2*n - 2:
-                self.boxes.append(Box( ((i, i+1), (i+1, i+n+1)), ((i, i+n), (i+n, i+n+1)) ))
+                self._add_box(game, ((i, i+1), (i+1, i+n+1)), ((i, i+n), (i+n, i+n+1)))
 
             # Any box along the left side of the board which is the top of a curve in the chain.
             elif i % (n*2) == 0:
-                self.boxes.append(Box( ((i, i+1), (i, i+n)), ((i+1, i+n+1), (i+n, i+n+1)) ))
+                self._add_box(game, ((i, i+1), (i, i+n)), ((i+1, i+n+1), (i+n, i+n+1)))
 
             # Any box along the right side of the board which is the bottom of a curve in the chain.
             elif i % (n*2) == n - 2:
-                self.boxes.append(Box( ((i+1, i+n+1), (i+n, i+n+1)), ((i, i+1), (i, i+n)) ))
+                self._add_box(game, ((i+1, i+n+1), (i+n, i+n+1)), ((i, i+1), (i, i+n)))
 
             # Any box that is not in the left-most or right-most column on the board.
             else:
-                self.boxes.append(Box( ((i, i+1), (i+n, i+n+1)), ((i, i+n), (i+1, i+n+1)) ))
+                self._add_box(game, ((i, i+1), (i+n, i+n+1)), ((i, i+n), (i+1, i+n+1)))
+
+    def _add_box(self, game, setup_moves, closing_moves):
+        '''Takes two tuples, each containing a pair of tuples which each contains
+        a pair of dots, and records them as the setup moves and closing moves of
+        the next box.'''
+        for move in setup_moves:
+            self.setup_moves.append(game.edge_ids[move])
+        for move in closing_moves:
+            self.closing_moves.append(game.edge_ids[move])
+
+    def _is_drawn(self, game, edge_id):
+        '''Returns True if the move with the given edge id has been made.'''
+        i, j = game.edges[edge_id]
+        return game.am[i][j] == 2
+
+    def _update_boxes(self, game):
+        '''Marks any newly setup boxes as setup, as well as any newly closable boxes
+        as closable. Only the boxes with a side drawn since the last update are checked.
+        Returns lists of the newly setup boxes and the newly closable boxes, in order.'''
+        new_edges = game.drawn_edges & ~self.drawn_edges
+        self.drawn_edges = game.drawn_edges
+
+        # Finds the boxes each newly drawn edge is a side of.
+        boxes = set()
+        while new_edges:
+            lowest = new_edges & -new_edges
+            new_edges ^= lowest
+            bit = lowest.bit_length() - 1
+            if bit < game.total_dots:
+                edge = (bit, bit + 1)
+            else:
+                edge = (bit - game.total_dots, bit - game.total_dots + game.dots_per_row)
+            boxes.update(game.edge_boxes[game.edge_ids[edge]])
+
+        newly_setup = []
+        newly_closable = []
+
+        for box in sorted(boxes):
+            if not self.setup[box]:
+                if (self._is_drawn(game, self.setup_moves[2 * box]) and
+                        self._is_drawn(game, self.setup_moves[2 * box + 1])):
+                    self.setup[box] = 1
+                    newly_setup.append(box)
+
+            if self.setup[box] and not self.closable[box]:
+                if self._is_drawn(game, self.closing_moves[2 * box]):
+                    # If the first closing move has been made, the
+                    # second closing move is the one which closes the box.
+                    self.closable[box] = 1
+                    self.final_move[box] = self.closing_moves[2 * box + 1]
+                    newly_closable.append(box)
+                elif self._is_drawn(game, self.closing_moves[2 * box + 1]):
+                    # If the second closing move has been made, the
+                    # first closing move is the one which closes the box.
+                    self.closable[box] = 1
+                    self.final_move[box] = self.closing_moves[2 * box]
+                    newly_closable.append(box)
+
+        return newly_setup, newly_closable
 
     def determine_next_move(self, game):
         '''Analyzes the current condition of the board and determines
-        the best possible move for Winning Player to make.'''
+        the best possible move for Winning Player to make.
+
+        With a cache, the move is looked up by what it depends on: the drawn edges now
+        and when the boxes were last checked (which decide which boxes are newly
+        closable), as bitboards (see Game.drawn_edges), and during a chain of consecutive
+        moves, where the chain stands. A hit replays the changes deciding the move made
+        to the player's state, so later moves are the same as without the cache.'''
+        moves_left = len(game.valid_moves)
+        if self.cache is None or self.cache.is_skipped(moves_left):
+            return self._decide_next_move(game)[0]
+
+        chain = None
+        if self.consecutive_move:
+            chain = (self.last_closed_box, self.start_of_chain, self.chain_traversal_direction)
+        key = (game.drawn_edges, self.drawn_edges, chain)
+
+        decision = self.cache.get(key, moves_left)
+        if decision is not None:
+            next_move_str, next_ordered_move, chain_state, newly_setup, newly_closable = decision
+            for box in newly_setup:
+                self.setup[box] = 1
+            for box, final_move in newly_closable:
+                self.closable[box] = 1
+                self.final_move[box] = final_move
+            self.drawn_edges = game.drawn_edges
+            self.next_ordered_move = next_ordered_move
+            if chain_state is not None:
+                (self.consecutive_move, self.last_closed_box, self.start_of_chain,
+                    self.chain_traversal_direction) = chain_state
+            return next_move_str
+
+        next_move_str, newly_setup, newly_closable = self._decide_next_move(game)
+
+        # The chain fields are only changed if a box became closable or a chain was
+        # being followed, and otherwise are left as they are on a hit.
+        chain_state = None
+        if newly_closable or chain is not None:
+            chain_state = (self.consecutive_move, self.last_closed_box, self.start_of_chain,
+                self.chain_traversal_direction)
+
+        self.cache.put(key, (next_move_str, self.next_ordered_move, chain_state,
+            tuple(newly_setup), tuple((box, self.final_move[box]) for box in newly_closable)))
+
+        return next_move_str
+
+    def _decide_next_move(self, game):
+        '''Works out the move for determine_next_move(). Returns the move, along
+        with the boxes which became set up and closable, as _update_boxes() does.'''
 
         # Keeps track of the best next move.
         next_move = None
 
-        # Remove all moves from ordered_moves which are no longer valid.
-        new_ordered_moves = []
-        for move in self.ordered_moves:
-            if move in game.valid_moves:
-                new_ordered_moves.append(move)
-
-        self.ordered_moves = new_ordered_moves
-
-        # Marks any newly setup boxes as setup,
-        # as well as any newly closable boxes as closable.
-        for box in self.boxes:
-            box.check_if_set_up(game.am)
-            if box.check_if_closable(game.am):
-                # If the box is closable, marks closing the box as the next move.
-                next_move = box.final_move
-                self.last_closed_box = self.boxes.index(box)
-                self.start_of_chain = self.boxes.index(box)
-                self.chain_traversal_direction = False
+        # Skips past moves in ordered_moves which are no longer valid.
+        while self.next_ordered_move < len(self.ordered_moves):
+            i, j = self.ordered_moves[self.next_ordered_move]
+            if game.am[i][j] == 1:
+                break
+            self.next_ordered_move += 1
+
+        # If any box has become closable, marks closing the last of them as the next move.
+        newly_setup, newly_closable = self._update_boxes(game)
+        if newly_closable:
+            box = newly_closable[-1]
+            next_move = game.edges[self.final_move[box]]
+            self.last_closed_box = box
+            self.start_of_chain = box
+            self.chain_traversal_direction = False
 
         # Executed if this one of a chain of consecutive moves
         if self.consecutive_move:
             # Chain is being traveresed backwards
             if self.chain_traversal_direction == False:
                 # Either there is no next box in this direction or the next box is not closable.
-                if self.last_closed_box == 0 or not self.boxes[self.last_closed_box - 1].closable:
+                if self.last_closed_box == 0 or not self.closable[self.last_closed_box - 1]:
                     # Begin traversing forwards from the start of the chain.
                     self.chain_traversal_direction = True
 
                     # Either there is no next box in this direction or the next box is not closable.
-                    if self.start_of_chain == game.total_boxes - 1 or not self.boxes[self.start_of_chain + 1].closable:
+                    if self.start_of_chain == game.total_boxes - 1 or not self.closable[self.start_of_chain + 1]:
                         # Marks the chain of consecutive moves as over.
                         self.consecutive_move = False
                     else:
                         # Marks closing the next box in this direction as the next move.
-                        next_move = self.boxes[self.start_of_chain + 1].final_move
+                        next_move = game.edges[self.final_move[self.start_of_chain + 1]]
                         # Marks this box as the last closed box.
                         self.last_closed_box = self.start_of_chain + 1
 
                 # The next box in this direction is closable
                 else:
                     # Marks closing the next box in this direction as the next move.
-                    next_move = self.boxes[self.last_closed_box - 1].final_move
+                    next_move = game.edges[self.final_move[self.last_closed_box - 1]]
                     # Marks this box as the last closed box.
                     self.last_closed_box = self.last_closed_box - 1
             else:
                 # Either there is no next box in this direction or the next box is not closable.
-                if self.last_closed_box == game.total_boxes - 1 or not self.boxes[self.last_closed_box + 1].closable:
+                if self.last_closed_box == game.total_boxes - 1 or not self.closable[self.last_closed_box + 1]:
                         # Marks the chain of consecutive moves as over.
                         self.consecutive_move = False
                 else:
                     # Marks closing the next box in this direction as the next move.
-                    next_move = self.boxes[self.last_closed_box + 1].final_move
+                    next_move = game.edges[self.final_move[self.last_closed_box + 1]]
                     # Marks this box as the last closed box.
                     self.last_closed_box = self.last_closed_box + 1
 
         # Executed if a next move has not yet been determines
         if not next_move:
-            # If no box is closable, marks the top-most move from ordered_moves
-            # as the next move and removes it from ordered_moves.
-            if self.ordered_moves:
-                next_move = self.ordered_moves.pop(0)
+            # If no box is closable, marks the top-most valid move from ordered_moves
+            # as the next move and moves past it.
+            if self.next_ordered_move < len(self.ordered_moves):
+                next_move = self.ordered_moves[self.next_ordered_move]
+                self.next_ordered_move += 1
             else:
                 # If no next move has been determined yet, select whatever move is available.
                 # This seems to occur at the end of a game.
@@ -553,94 +1342,312 @@ class WinningPlayer:
         # interpretted by Game.move().
         next_move_str = '{} {}'.format(*next_move)
 
-        return next_move_str
+        return next_move_str, newly_setup, newly_closable
 
-class Box:
-    '''Class used to store and modify information relevant to Winnning Player
-    about a box on the board.'''
+class RandomPlayer:
+    '''Player which makes the same moves as Game.random_play(), drawing
+    them from rng, for use anywhere a player with a determine_next_move()
+    function is expected.'''
 
-    def __init__(self, setup_moves, closing_moves):
-        '''Takes two tuples, each containing a pair of tuples which each contains
-        a pair of dots. Uses this data to establish under what conditions the box should be closed
-        by Winning Player.'''
+    def __init__(self, game, rng=random):
+        # Source of the random moves.
+        self.rng = rng
+
+    def determine_next_move(self, game):
+        '''Returns a move selected at random from valid_moves as a formatted
+        string which can be interpretted by Game.move().'''
+        x = self.rng.randint(0, len(game.valid_moves) - 1)
+        return '{} {}'.format(*game.valid_moves[x])
+
+class ShuffledRandomPlayer:
+    '''Player which shuffles every edge on the board once, at the start of the game,
+    and always makes the first valid move in that order. Each move is still equally
+    likely to be any of the valid moves, but two games played from the same shuffle
+    keep making the same choices for as long as those choices are available, which
+    makes them useful as common random numbers when comparing players.'''
+
+    def __init__(self, game, rng=random):
+        # The order the moves will be made in.
+        self.move_order = list(game.edges)
+        rng.shuffle(self.move_order)
+
+        # Position in move_order before which every move has already been made.
+        # Moves only ever stop being valid, so this never needs to move backwards.
+        self.position = 0
 
-        # The two moves which should be made in order to set the box up for
-        # Random Player to make it closable.
-        self.setup_moves = setup_moves
+    def determine_next_move(self, game):
+        '''Returns the first valid move in move_order as a formatted string
+        which can be interpretted by Game.move().'''
+        # Skips past moves which have already been made by either player.
+        while game.am[self.move_order[self.position][0]][self.move_order[self.position][1]] != 1:
+            self.position += 1
 
-        # Two moves, either of which must be made after Random Player
-        # has made the box closable.
-        self.closing_moves = closing_moves
+        return '{} {}'.format(*self.move_order[self.position])
 
-        # Whether or not the box has been setup to become closable.
-        self.setup = False
+class GreedyPlayer:
+    '''Player which makes the same moves as Game.greedy_play(), for use anywhere
+    a player with a determine_next_move() function is expected.'''
 
-        # Whether or not the box is closable (i.e. three of sides are connected).
-        self.closable = False
+    def __init__(self, game, rng=random):
+        # Source of the random choices between equally good moves.
+        self.rng = rng
 
-        # This value is set after the box becomes closable. Indicates
-        # the move which needs to be made in order to close the box.
-        self.final_move = None
+    def determine_next_move(self, game):
+        '''Returns the move greedy_play() would make as a formatted string
+        which can be interpretted by Game.move().'''
+        return '{} {}'.format(*game.choose_greedy_move(self.rng))
+
+class MoveSet:
+    '''A set of moves which supports adding, removing and picking a move by
+    index in constant time, so that a move can be selected from it at random.'''
+
+    def __init__(self, moves=()):
+        # The moves in the set, in no particular order.
+        self.moves = list(moves)
+
+        # Maps each move to its position in moves.
+        self.positions = dict(zip(self.moves, range(len(self.moves))))
+
+    def add(self, move):
+        '''Adds move to the set.'''
+        self.positions[move] = len(self.moves)
+        self.moves.append(move)
+
+    def remove(self, move):
+        '''Removes move from the set by swapping the last move into its place.'''
+        position = self.positions.pop(move)
+        last_move = self.moves.pop()
+        if last_move != move:
+            self.moves[position] = last_move
+            self.positions[last_move] = position
+
+    def __contains__(self, move):
+        return move in self.positions
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __getitem__(self, index):
+        return self.moves[index]
+
+    def __iter__(self):
+        return iter(self.moves)
+
+class SumTree:
+    '''A list of non-negative weights stored in a binary tree where each node
+    holds the sum of the weights below it, so that a weight can be changed and
+    an index can be picked in proportion to its weight in O(log n) time.'''
+
+    def __init__(self, size):
+        # Number of leaves, rounded up to a power of two.
+        self.capacity = 1
+        while self.capacity < size:
+            self.capacity *= 2
+
+        # Node k has children 2k and 2k + 1, and leaf i is node capacity + i.
+        # Node 0 is unused.
+        self.tree = [0] * (2 * self.capacity)
+
+    def __getitem__(self, index):
+        return self.tree[self.capacity + index]
+
+    def __setitem__(self, index, weight):
+        '''Sets the weight at index and recomputes the sums above it. Sums are
+        recomputed from both children rather than adjusted by the difference,
+        so weights set back to 0 leave no rounding error behind.'''
+        node = self.capacity + index
+        self.tree[node] = weight
+        node //= 2
+        while node:
+            self.tree[node] = self.tree[2 * node] + self.tree[2 * node + 1]
+            node //= 2
+
+    def total(self):
+        '''Returns the sum of every weight.'''
+        return self.tree[1]
+
+    def find(self, value):
+        '''Returns the index i such that the weights before i add up to at most value
+        and the weights up to and including i add up to more than value, where value
+        is between 0 and total(). Indexes with a weight of 0 are never returned
+        while total() is more than 0.'''
+        node = 1
+        while node < self.capacity:
+            left = 2 * node
+            # Never descends into a subtree whose weights are all 0, which could
+            # otherwise happen if value rounded up to the total.
+            if value < self.tree[left] or self.tree[left + 1] == 0:
+                node = left
+            else:
+                value -= self.tree[left]
+                node = left + 1
+        return node - self.capacity
+
+def uniform_weights(game, move):
+    '''Weights every move the same, as Random Player does.'''
+    return 1
+
+def get_move_class_weights(capturing=1, safe=1, sacrificing=1):
+    '''Returns a weight function for WeightedRandomPlayer which weights each move
+    by whether it closes a box, is safe, or draws the third side of a box.'''
+    def get_weight(game, move):
+        if move in game.capturing_moves:
+            return capturing
+        elif move in game.sacrificing_moves:
+            return sacrificing
+        return safe
+    return get_weight
+
+class WeightedRandomPlayer:
+    '''Player which picks each valid move at random with probability proportional
+    to its weight. Weights come from get_weight(game, move), which must only depend
+    on the boxes the move is a side of (such as uniform_weights() or a function from
+    get_move_class_weights()), since only the sides of boxes touched by new moves are
+    weighed again. Each turn costs O(log n) per weight which changed, rather than a
+    scan of every valid move. If every valid move has a weight of 0, one is picked
+    uniformly instead.'''
+
+    def __init__(self, game, get_weight=uniform_weights, rng=random):
+        self.get_weight = get_weight
+        self.rng = rng
+
+        # Weight of each edge id, 0 once the edge has been drawn.
+        self.weights = SumTree(len(game.edges))
+
+        # Maps each bit of Game.drawn_edges to its edge id.
+        self.bit_edges = {}
+        for edge_id, edge in enumerate(game.edges):
+            self.bit_edges[game.edge_bit(*edge)] = edge_id
+
+        # Game.drawn_edges as of the last time the weights were updated.
+        self.drawn_edges = game.drawn_edges
+
+        for edge_id, edge in enumerate(game.edges):
+            if game.am[edge[0]][edge[1]] == 1:
+                self.weights[edge_id] = get_weight(game, edge)
+
+    def _update_weights(self, game):
+        '''Weighs again the undrawn sides of every box touched by
+        a move made since the last update.'''
+        new_edges = game.drawn_edges & ~self.drawn_edges
+        self.drawn_edges = game.drawn_edges
+
+        while new_edges:
+            lowest = new_edges & -new_edges
+            new_edges ^= lowest
+            edge_id = self.bit_edges[lowest.bit_length() - 1]
+
+            self.weights[edge_id] = 0
+
+            for box in game.edge_boxes[edge_id]:
+                for side in game.box_edges[box]:
+                    edge = game.edges[side]
+                    if game.am[edge[0]][edge[1]] == 1:
+                        self.weights[side] = self.get_weight(game, edge)
 
-        # Indicates whether or not the box is closed. If this value is
-        # set to True, check_if_set_up() or check_if_closable() will both
-        # return False.
-        self.closed = False
+    def determine_next_move(self, game):
+        '''Returns a move picked in proportion to its weight as a formatted
+        string which can be interpretted by Game.move().'''
+        self._update_weights(game)
 
-    def check_if_set_up(self, am):
-        '''Checks to see if a box is setup to become closable, first by
-        checking to see whether setup or closed is True, then
-        by checking the board to see if both setup moves have been made. If they
-        have, setup is set to True'''
+        total = self.weights.total()
+        if total > 0:
+            edge = game.edges[self.weights.find(self.rng.random() * total)]
+        else:
+            edge = game.valid_moves[self.rng.randint(0, len(game.valid_moves) - 1)]
+
+        return '{} {}'.format(*edge)
+
+def get_wilson_interval(successes, n, z):
+    '''Returns the Wilson score interval (low, high) for a proportion
+    of successes out of n trials, where z is the normal quantile of the
+    desired confidence level.'''
+    p = successes / n
+    denominator = 1 + z ** 2 / n
+    center = (p + z ** 2 / (2 * n)) / denominator
+    half_width = z * (p * (1 - p) / n + z ** 2 / (4 * n ** 2)) ** 0.5 / denominator
+    return center - half_width, center + half_width
+
+def get_confidence_intervals(results, confidence):
+    '''Takes a list of results returned by Game.play_game_without_output() and
+    returns a dictionary mapping each of 'win', 'loss', 'tie' (from Winning Player's
+    point of view) and 'margin' (Winning Player's score minus Random Player's score)
+    to a tuple (estimate, low, high) at the given confidence level.'''
+    n = len(results)
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+
+    intervals = {}
+
+    # The last member of each result is 0 for a win, 1 for a loss and 2 for a tie.
+    for name, outcome in [('win', 0), ('loss', 1), ('tie', 2)]:
+        successes = len([i for i in results if i[3] == outcome])
+        low, high = get_wilson_interval(successes, n, z)
+        intervals[name] = (successes / n, low, high)
+
+    margins = [i[1] - i[2] for i in results]
+    mean_margin = statistics.mean(margins)
+    half_width = z * statistics.stdev(margins) / n ** 0.5
+    intervals['margin'] = (mean_margin, mean_margin - half_width, mean_margin + half_width)
+
+    return intervals
+
+def get_sequential_confidence(confidence, max_rounds, batch_size):
+    '''Returns the confidence level play_games_until_precise() checks its intervals
+    at, so that the intervals of the games it stops at have at least the given
+    confidence. Checking a fixed-level interval after every batch and stopping the
+    first time it is narrow enough makes it miss more often than it should, so the
+    chance of a miss allowed is split evenly between every check which could be made
+    (a Bonferroni correction).'''
+    checks = max(1, -(-max_rounds // batch_size))
+    return 1 - (1 - confidence) / checks
+
+def play_games_until_precise(boxes_per_row, max_rounds, precision, confidence=0.95, batch_size=100,
+        recorder=None):
+    '''Plays games of Winning Player against Random Player in batches of batch_size,
+    stopping once every win, loss and tie rate is known to within precision (the
+    half-width of its confidence interval) and the mean score margin is known to within
+    precision times the number of boxes, or once max_rounds games have been played.
+    The intervals are checked at the level get_sequential_confidence() returns for
+    confidence, which is also the level they should be reported at.
+    Because games are played in the same order, the results are the first games that
+    playing all max_rounds games would have produced. Returns the list of results.
+    If recorder is given, it is passed on to Game.play_game_without_output().'''
 
-        # Checks to see if the box is already considered setup or has already been closed.
-        if self.setup or self.closed:
-            return
-        
-        sm = self.setup_moves # Condenses variable name for readability
-
-        # If both setup moves have been made, sets setup to True.
-        if am[sm[0][0]][sm[0][1]] == 2 and am[sm[1][0]][sm[1][1]] == 2:
-            self.setup = True
-
-    def check_if_closable(self, am):
-        '''Checks to see if a box closable, first by
-        checking to see whether closable or closed is True, and then
-        by checking the board to see if both setup moves have been made
-        and one of either closing moves has already been made. If they
-        have been, closable is set to True. Returns True if the box is closable,
-        and False otherwise.'''
-
-        # Checks to see if the box is already considered closable or has already been closed.
-        if self.closable or self.closed:
-            return False
+    results = []
+    level = get_sequential_confidence(confidence, max_rounds, batch_size)
+
+    while len(results) < max_rounds:
+        for _ in range(min(batch_size, max_rounds - len(results))):
+            game = Game(boxes_per_row)
+            results.append(game.play_game_without_output(recorder))
+
+        if len(results) < 2:
+            continue
 
-        cm = self.closing_moves # Condenses variable name for readability
-
-        # First checks to see if both setup moves have been made.
-        if self.setup:
-            if am[cm[0][0]][cm[0][1]] == 2:
-                # If the first closing move has been made,
-                # closable is set to true, final_move is set
-                # to the second closing move and True is returned.
-                self.closable = True
-                self.final_move = cm[1]
-                return True
-            elif am[cm[1][0]][cm[1][1]] == 2:
-                # If the second closing move has been made,
-                # closable is set to true, final_move is set
-                # to the first closing move and True is returned.
-                self.closable = True
-                self.final_move = cm[0]
-                return True
-
-        return False
-
-    def close_box(self):
-        '''Used to set the box as closed.'''
-        self.closed = True
-        self.setup = False
-        self.closable = False
+        intervals = get_confidence_intervals(results, level)
+
+        precise = True
+        for name in ['win', 'loss', 'tie']:
+            estimate, low, high = intervals[name]
+            if (high - low) / 2 > precision:
+                precise = False
+
+        estimate, low, high = intervals['margin']
+        if (high - low) / 2 > precision * boxes_per_row ** 2:
+            precise = False
+
+        if precise:
+            break
+
+    return results
+
+def _input_or_blank(prompt):
+    '''Returns the answer to prompt, or a blank answer if there is no more input,
+    so that scripts which only answer the earlier prompts keep working.'''
+    try:
+        return input(prompt)
+    except EOFError:
+        return ''
 
 def main():
     answer = input('Enter how many boxes per row you would like to play with on the board: ')
@@ -677,7 +1684,28 @@ def main():
         except:
             print('Invalid input, please try again.')
             answer = input('Enter a number of rounds to play: ')
-            
+
+    answer = _input_or_blank('Enter a precision to stop early at, e.g. 0.01 (leave blank to play every round): ')
+
+    # Repeatedly prompts the user until valid input is entered.
+    while True:
+        try:
+            # Blank input means every round is played.
+            if answer.strip() == '':
+                precision = None
+                break
+            precision = float(answer)
+            # Confidence intervals need at least two results.
+            if 0 < precision < 1 and rounds < 2:
+                print('Stopping early needs at least 2 rounds, please leave blank.')
+            elif 0 < precision < 1:
+                break
+            else:
+                print('Invalid input, please try again.')
+        except:
+            print('Invalid input, please try again.')
+        answer = _input_or_blank('Enter a precision to stop early at, e.g. 0.01 (leave blank to play every round): ')
+
 
     # Winning player goes first
     output = game.play_with_output(0)
@@ -692,57 +1720,40 @@ def main():
     fp.close()
 
     results = []
-    wins = [0, 0, 0]
-
-    # Plays the game the number of designated times,
-    # recording the results each time.
-    for _ in range(rounds):
-        game = Game(boxes_per_row)
-        result = game.play_game_without_output()
-        results.append(result)
-        wins[result[3]] += 1
-
-    total_rounds = sum([i[0] for i in results])
-
-    avg_1 = statistics.mean([i[1] for i in results])
-    avg_2 =  statistics.mean([i[2] for i in results])
-
-    med_1 = statistics.median([i[1] for i in results])
-    med_2 =  statistics.median([i[2] for i in results])
-
-    max_1 = max([i[1] for i in results])
-    max_2 = max([i[2] for i in results])
-
-    min_1 = min([i[1] for i in results])
-    min_2 = min([i[2] for i in results])
-
-    output = '''
-Total number of rounds played: {}
-Winning Player average: {}
-Random Player average: {}
-Winning Player median: {}
-Random Player median: {}
-Winning Player highest score: {}
-Random Player highest score: {}
-Winning Player lowest score: {}
-Random Player lowest score: {}
-Winning Player total wins: {}
-Random Player total wins: {}
-Ties: {}
-'''.format(
-    total_rounds,
-    avg_1,
-    avg_2,
-    med_1,
-    med_2,
-    max_1,
-    max_2,
-    min_1,
-    min_2,
-    wins[0],
-    wins[1],
-    wins[2]
-)
+    recorder = StartingPlayerRecorder()
+    batch_size = 100
+
+    if precision is None:
+        # Plays the game the number of designated times,
+        # recording the results each time.
+        for _ in range(rounds):
+            game = Game(boxes_per_row)
+            result = game.play_game_without_output(recorder)
+            results.append(result)
+    else:
+        # Plays games until the results are known to within precision.
+        results = play_games_until_precise(boxes_per_row, rounds, precision,
+            batch_size=batch_size, recorder=recorder)
+
+    # Keeps every game in results.db, since multiple_play.txt is overwritten
+    # each run. Use results_store.py to summarize past runs.
+    store = ResultsStore()
+    store.add_run(boxes_per_row, seed, results, recorder.starting_players)
+    store.close()
+
+    output = format_summary(summarize_results(results))
+
+    if precision is not None:
+        level = get_sequential_confidence(0.95, rounds, batch_size)
+        intervals = get_confidence_intervals(results, level)
+        output += 'Games played: {} of {} ({} saved by stopping early)\n'.format(
+            len(results), rounds, rounds - len(results))
+        output += '95% confidence intervals (each check made at {:.4%} to allow for stopping early):\n'.format(level)
+        output += 'Winning Player win rate: {:.4f} [{:.4f}, {:.4f}]\n'.format(*intervals['win'])
+        output += 'Random Player win rate: {:.4f} [{:.4f}, {:.4f}]\n'.format(*intervals['loss'])
+        output += 'Tie rate: {:.4f} [{:.4f}, {:.4f}]\n'.format(*intervals['tie'])
+        output += 'Mean score margin: {:.4f} [{:.4f}, {:.4f}]\n'.format(*intervals['margin'])
+
     fp = open('multiple_play.txt', 'w')
     fp.write(output)
     fp.close()
@@ -0,0 +1,136 @@
+import argparse
+import random
+import statistics
+
+from honors2 import Game, GreedyPlayer, RandomPlayer, ShuffledRandomPlayer, WinningPlayer
+
+# Players which can be compared. Each takes the game about to be played and a
+# random.Random instance for any choices of its own, and returns an object with a
+# determine_next_move() function.
+PLAYERS = {
+    'winning': lambda game, rng: WinningPlayer(game),
+    'greedy': lambda game, rng: GreedyPlayer(game, rng),
+}
+
+# Ways Random Player can draw its moves from its seed. 'shuffled' draws one order of
+# every edge for the whole game, so the two players' games keep making the same random
+# choices for as long as those choices are available. 'stream' replays the
+# same sequence of random numbers as indexes into valid_moves, like Game.random_play().
+OPPONENTS = {
+    'shuffled': ShuffledRandomPlayer,
+    'stream': RandomPlayer,
+}
+
+def play_paired_games(boxes_per_row, player_a, player_b, pairs, seed, opponent=ShuffledRandomPlayer):
+    '''Compares two players by pitting each of them against Random Player on
+    common random numbers. For each of the given number of pairs, a seed is drawn
+    for Random Player and one for the players' own choices, and both players play the
+    same two games from those seeds: one where they move first and a mirrored one where
+    Random Player moves first. Random Player is played by the opponent class.
+    Returns a list with one tuple per pair containing, for player_a and then
+    player_b, the mean score margin and the mean win rate over the two games.'''
+
+    master_rng = random.Random(seed)
+    pair_results = []
+
+    for _ in range(pairs):
+        opponent_seed = master_rng.getrandbits(64)
+        player_seed = master_rng.getrandbits(64)
+
+        pair_result = []
+
+        for player_factory in (player_a, player_b):
+            margins = []
+            wins = []
+
+            for starting_player in (0, 1):
+                game = Game(boxes_per_row)
+                player = player_factory(game, random.Random(player_seed))
+                random_player = opponent(game, random.Random(opponent_seed))
+                result = game.play_game_between(player, random_player, starting_player)
+
+                margins.append(result[1] - result[2])
+                if result[3] == 0:
+                    wins.append(1)
+                else:
+                    wins.append(0)
+
+            pair_result.append(statistics.mean(margins))
+            pair_result.append(statistics.mean(wins))
+
+        pair_results.append(tuple(pair_result))
+
+    return pair_results
+
+def summarize_difference(values_a, values_b):
+    '''Returns a dictionary describing the difference between two paired samples:
+    the mean of each, the mean paired difference, its standard error, the standard
+    error the same number of independent games would have had, and how many times
+    fewer games the pairing needs for the same precision. Raises a ValueError if
+    there are fewer than two pairs, since their variance cannot be estimated.'''
+    n = len(values_a)
+    if n < 2:
+        raise ValueError('at least 2 pairs are needed, not {}'.format(n))
+    differences = [a - b for a, b in zip(values_a, values_b)]
+
+    paired_variance = statistics.variance(differences)
+    unpaired_variance = statistics.variance(values_a) + statistics.variance(values_b)
+
+    if paired_variance > 0:
+        reduction = unpaired_variance / paired_variance
+    else:
+        reduction = float('inf')
+
+    return {
+        'mean_a': statistics.mean(values_a),
+        'mean_b': statistics.mean(values_b),
+        'difference': statistics.mean(differences),
+        'paired_se': (paired_variance / n) ** 0.5,
+        'unpaired_se': (unpaired_variance / n) ** 0.5,
+        'variance_reduction': reduction,
+    }
+
+def format_report(name_a, name_b, pair_results):
+    '''Returns the comparison of the two players as a formatted string.'''
+    output = 'Pairs played: {} ({} games per player)\n'.format(
+        len(pair_results), 2 * len(pair_results))
+
+    for label, index in [('Score margin', 0), ('Win rate', 1)]:
+        summary = summarize_difference([i[index] for i in pair_results],
+            [i[index + 2] for i in pair_results])
+        output += '\n{}:\n'.format(label)
+        output += '  {}: {:.4f}\n'.format(name_a, summary['mean_a'])
+        output += '  {}: {:.4f}\n'.format(name_b, summary['mean_b'])
+        output += '  Difference: {:.4f} +/- {:.4f} (paired standard error)\n'.format(
+            summary['difference'], summary['paired_se'])
+        output += '  Standard error without pairing: {:.4f}\n'.format(summary['unpaired_se'])
+        output += '  Variance reduction: {:.2f}x fewer games for the same precision\n'.format(
+            summary['variance_reduction'])
+
+    return output
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares two players against Random '
+        'Player using paired games which share the same random numbers.')
+    parser.add_argument('player_a', choices=sorted(PLAYERS))
+    parser.add_argument('player_b', choices=sorted(PLAYERS))
+    parser.add_argument('--boxes-per-row', type=int, default=4,
+        help='size of the board (default: 4)')
+    parser.add_argument('--pairs', type=int, default=500,
+        help='number of seeds, each played with both starting players (default: 500)')
+    parser.add_argument('--opponent', choices=sorted(OPPONENTS), default='shuffled',
+        help='how Random Player draws its moves from its seed (default: shuffled)')
+    parser.add_argument('--seed', type=int, default=0,
+        help='random seed (default: 0)')
+    args = parser.parse_args()
+
+    if args.pairs < 2:
+        parser.error('--pairs must be at least 2 to estimate standard errors')
+
+    pair_results = play_paired_games(args.boxes_per_row, PLAYERS[args.player_a],
+        PLAYERS[args.player_b], args.pairs, args.seed, OPPONENTS[args.opponent])
+
+    print(format_report(args.player_a, args.player_b, pair_results))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+import argparse
+import sys
+import time
+from collections import Counter
+
+from honors2 import Game
+
+# Known results of walking every possible game to completion, used to check that
+# Game.move() and Game.check_for_box() generate moves, detect boxes and hand out
+# extra turns correctly. For each board size, nodes[d] is the number of move
+# sequences of length d, captures[d] is the number of those sequences whose last
+# move closed at least one box, double_captures[d] is the number whose last move
+# closed two boxes, and terminal_scores maps each final score (A, B) to the number
+# of complete games ending with it when Player A moves first.
+REFERENCE = {
+    1: {
+        'nodes': [1, 4, 12, 24, 24],
+        'captures': [0, 0, 0, 0, 24],
+        'double_captures': [0, 0, 0, 0, 0],
+        'terminal_scores': {(0, 1): 24},
+    },
+    2: {
+        'nodes': [1, 12, 132, 1320, 11880, 95040, 665280, 3991680, 19958400,
+            79833600, 239500800, 479001600, 479001600],
+        'captures': [0, 0, 0, 0, 96, 3072, 53760, 642240, 5544000,
+            34513920, 148055040, 391910400, 479001600],
+        'double_captures': [0, 0, 0, 0, 0, 0, 0, 2880, 100800,
+            1612800, 14515200, 72576000, 159667200],
+        'terminal_scores': {(0, 4): 116660736, (1, 3): 84828672, (2, 2): 76096512,
+            (3, 1): 82192896, (4, 0): 119222784},
+    },
+}
+
+class PerftResult:
+    '''Counts gathered while walking every move sequence from a position.
+    Each list is indexed by the number of moves made from that position.'''
+
+    def __init__(self, depth):
+        # Number of move sequences of each length.
+        self.nodes = [0] * (depth + 1)
+
+        # Number of move sequences of each length whose last move closed a box.
+        self.captures = [0] * (depth + 1)
+
+        # Number of move sequences of each length whose last move closed two boxes.
+        self.double_captures = [0] * (depth + 1)
+
+        # Maps each final score (A, B) to the number of finished games ending with it.
+        self.terminal_scores = Counter()
+
+    def add_child(self, child, boxes_closed):
+        '''Adds the counts of the position reached by a move which closed
+        boxes_closed boxes, shifting them down by one move.'''
+        for k in range(len(child.nodes)):
+            self.nodes[k + 1] += child.nodes[k]
+            self.captures[k + 1] += child.captures[k]
+            self.double_captures[k + 1] += child.double_captures[k]
+
+        if boxes_closed:
+            self.captures[1] += 1
+        if boxes_closed == 2:
+            self.double_captures[1] += 1
+
+        self.terminal_scores.update(child.terminal_scores)
+
+def perft(game, depth, active_player, cache=None, stats=None):
+    '''Walks every sequence of up to depth moves from the current position of game,
+    where active_player is about to move, and returns a PerftResult. The game is left
+    as it was found. If cache is a dictionary, results are stored in it by position so
+    that positions reached through different move orders are only walked once. If stats
+    is a dictionary, the number of moves actually made is added to stats['moves'].'''
+
+    result = PerftResult(depth)
+    result.nodes[0] = 1
+
+    # The game is over, so this is a finished game.
+    if sum(game.score) == game.total_boxes:
+        result.terminal_scores[tuple(game.score)] += 1
+        return result
+
+    if depth == 0:
+        return result
+
+    if cache is not None:
+        # The rest of the game only depends on which edges are drawn,
+        # whose turn it is and the score so far.
+        key = (game.drawn_edges, active_player, game.score[0], game.score[1], depth)
+        if key in cache:
+            return cache[key]
+
+    # valid_moves changes as moves are made and undone, so a copy is walked.
+    for move in list(game.valid_moves):
+        move_str = '{} {}'.format(*move)
+
+        score_before = sum(game.score)
+        outcome = game.move(active_player, move_str)
+        boxes_closed = sum(game.score) - score_before
+
+        if stats is not None:
+            stats['moves'] += 1
+
+        # Closing a box gives the same player another turn.
+        if outcome == 1:
+            next_player = active_player
+        else:
+            next_player = 1 - active_player
+
+        child = perft(game, depth - 1, next_player, cache, stats)
+        game.undo_move(move_str)
+
+        result.add_child(child, boxes_closed)
+
+    if cache is not None:
+        cache[key] = result
+
+    return result
+
+def check_against_reference(boxes_per_row, result):
+    '''Compares a full-depth result against REFERENCE. Returns a list of
+    descriptions of any differences, which is empty if everything matches.'''
+    reference = REFERENCE[boxes_per_row]
+    errors = []
+
+    for name in ['nodes', 'captures', 'double_captures']:
+        expected = reference[name]
+        actual = getattr(result, name)
+        if list(actual) != expected:
+            errors.append('{}: expected {}, got {}'.format(name, expected, list(actual)))
+
+    if dict(result.terminal_scores) != reference['terminal_scores']:
+        errors.append('terminal_scores: expected {}, got {}'.format(
+            reference['terminal_scores'], dict(result.terminal_scores)))
+
+    return errors
+
+def format_report(result, elapsed, moves_made, cached):
+    '''Returns the counts of a perft run as a formatted table. Speed is reported as
+    moves actually made per second. Nodes per second is only reported if cached is
+    False, since with the cache most nodes are counted without being visited.'''
+    output = '{:>5} {:>14} {:>14} {:>16}\n'.format('depth', 'nodes', 'captures', 'double captures')
+    for k in range(len(result.nodes)):
+        output += '{:>5} {:>14} {:>14} {:>16}\n'.format(
+            k, result.nodes[k], result.captures[k], result.double_captures[k])
+
+    output += '\nTerminal scores (A, B):\n'
+    for score in sorted(result.terminal_scores):
+        output += '{:>10}: {}\n'.format('{}-{}'.format(*score), result.terminal_scores[score])
+
+    total_nodes = sum(result.nodes)
+    output += '\nTotal nodes: {}\n'.format(total_nodes)
+    output += 'Moves made: {}\n'.format(moves_made)
+    output += 'Time: {:.3f} s\n'.format(elapsed)
+    if elapsed > 0:
+        output += 'Moves made per second: {:.0f}\n'.format(moves_made / elapsed)
+        if not cached:
+            output += 'Nodes per second: {:.0f}\n'.format(total_nodes / elapsed)
+
+    return output
+
+def main():
+    parser = argparse.ArgumentParser(description='Walks every possible sequence of moves '
+        'from an empty board, counting positions, captures and final scores.')
+    parser.add_argument('--boxes-per-row', type=int, default=1,
+        help='size of the board (default: 1)')
+    parser.add_argument('--depth', type=int, default=None,
+        help='number of moves to walk (default: until every game is over)')
+    parser.add_argument('--no-cache', action='store_true',
+        help='walk every move sequence instead of reusing results for repeated positions')
+    parser.add_argument('--check', action='store_true',
+        help='compare a full-depth walk against the known reference values')
+    args = parser.parse_args()
+
+    game = Game(args.boxes_per_row)
+    depth = args.depth
+    if depth is None:
+        depth = len(game.valid_moves)
+
+    cache = None
+    if not args.no_cache:
+        cache = {}
+    stats = {'moves': 0}
+
+    start = time.perf_counter()
+    # Player A moves first.
+    result = perft(game, depth, 0, cache, stats)
+    elapsed = time.perf_counter() - start
+
+    print(format_report(result, elapsed, stats['moves'], cache is not None))
+
+    if args.check:
+        if args.boxes_per_row not in REFERENCE or depth != len(game.valid_moves):
+            print('No reference values for this board size and depth.')
+            sys.exit(2)
+        errors = check_against_reference(args.boxes_per_row, result)
+        if errors:
+            for error in errors:
+                print('MISMATCH ' + error)
+            sys.exit(1)
+        print('All counts match the reference values.')
+
+if __name__ == '__main__':
+    main()
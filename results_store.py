@@ -0,0 +1,70 @@
+import argparse
+import random
+import time
+
+from game_results import (WINNING_VS_RANDOM, ResultsStore, StartingPlayerRecorder, format_summary,
+    summarize_aggregate)
+from honors2 import Game
+
+def play_and_store(store, boxes_per_row, seed, rounds):
+    '''Seeds random with seed, plays rounds games of Winning Player against
+    Random Player and adds them to store as one run.
+    Returns the run id.'''
+    random.seed(seed)
+    recorder = StartingPlayerRecorder()
+    results = []
+    for _ in range(rounds):
+        game = Game(boxes_per_row)
+        results.append(game.play_game_without_output(recorder))
+    return store.add_run(boxes_per_row, seed, results, recorder.starting_players)
+
+def main():
+    parser = argparse.ArgumentParser(description='Stores the results of games in an '
+        'SQLite database and summarizes them.')
+    parser.add_argument('--database', default='results.db',
+        help='path of the database (default: results.db)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run',
+        help='play games of Winning Player against Random Player and store them')
+    run_parser.add_argument('--boxes-per-row', type=int, default=4,
+        help='size of the board (default: 4)')
+    run_parser.add_argument('--rounds', type=int, default=1000,
+        help='number of games to play (default: 1000)')
+    run_parser.add_argument('--seed', type=int, default=0,
+        help='random seed (default: 0)')
+
+    query_parser = subparsers.add_parser('query',
+        help='print the summary statistics of the stored games')
+    query_parser.add_argument('--boxes-per-row', type=int, default=4,
+        help='size of the board (default: 4)')
+    query_parser.add_argument('--matchup', default=WINNING_VS_RANDOM,
+        help='matchup to summarize (default: {})'.format(WINNING_VS_RANDOM))
+    query_parser.add_argument('--seed', type=int,
+        help='only summarize games played from this seed')
+    query_parser.add_argument('--run', type=int,
+        help='only summarize games from this run')
+
+    args = parser.parse_args()
+
+    store = ResultsStore(args.database)
+
+    if args.command == 'run':
+        start = time.perf_counter()
+        run_id = play_and_store(store, args.boxes_per_row, args.seed, args.rounds)
+        print('Stored {} games as run {} ({:.2f} s)'.format(
+            args.rounds, run_id, time.perf_counter() - start))
+    else:
+        start = time.perf_counter()
+        aggregate = store.query_aggregate(args.boxes_per_row, args.matchup, args.seed, args.run)
+        elapsed = time.perf_counter() - start
+        if aggregate['games'] == 0:
+            print('No games stored for these filters.')
+        else:
+            print(format_summary(summarize_aggregate(aggregate)))
+            print('Games summarized: {} ({:.3f} s)'.format(aggregate['games'], elapsed))
+
+    store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+import argparse
+import math
+import multiprocessing
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+from honors2 import Game, WinningPlayer
+
+# The parts of a game which are timed separately. Each is reported in seconds
+# per game and has its own complexity exponent fitted.
+COMPONENTS = [
+    'Game.__init__',
+    'WinningPlayer.__init__',
+    'determine_next_move',
+    'check_for_box',
+    'valid_moves.remove',
+    'total',
+]
+
+class TimedList(list):
+    '''A list which records how long calls to remove() take. Used in place of
+    Game.valid_moves so that its cost can be separated from the rest of Game.move().'''
+
+    def __init__(self, items, timings):
+        super().__init__(items)
+        self.timings = timings
+
+    def remove(self, item):
+        start = time.perf_counter()
+        super().remove(item)
+        self.timings['valid_moves.remove'] += time.perf_counter() - start
+
+class TimedGame(Game):
+    '''A Game which records how long calls to check_for_box() take.'''
+
+    def __init__(self, boxes_per_row, timings):
+        self.timings = timings
+        super().__init__(boxes_per_row)
+        self.valid_moves = TimedList(self.valid_moves, timings)
+
+    def check_for_box(self, player, a, b):
+        start = time.perf_counter()
+        result = super().check_for_box(player, a, b)
+        self.timings['check_for_box'] += time.perf_counter() - start
+        return result
+
+def play_timed_game(boxes_per_row):
+    '''Plays a game of Winning Player against Random Player the same way as
+    Game.play_game_without_output(), timing each component. Returns a dictionary of
+    the time spent in each component and a list of the time taken by each move.'''
+
+    timings = {}
+    for component in COMPONENTS:
+        timings[component] = 0.0
+
+    game_start = time.perf_counter()
+
+    start = time.perf_counter()
+    game = TimedGame(boxes_per_row, timings)
+    timings['Game.__init__'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    winning_player = WinningPlayer(game)
+    timings['WinningPlayer.__init__'] = time.perf_counter() - start
+
+    move_latencies = []
+
+    active_player = random.randint(0, 1)
+
+    while sum(game.score) < game.total_boxes:
+        move_start = time.perf_counter()
+
+        if active_player == 0:
+            start = time.perf_counter()
+            winning_player_move = winning_player.determine_next_move(game)
+            timings['determine_next_move'] += time.perf_counter() - start
+            result = game.move(active_player, winning_player_move)
+        else:
+            result = game.random_play(active_player)
+
+        move_latencies.append(time.perf_counter() - move_start)
+
+        # If no point was scored, switches active player to the other player
+        if result == 0:
+            active_player = 1 - active_player
+
+    timings['total'] = time.perf_counter() - game_start
+
+    return timings, move_latencies
+
+def measure_peak_memory(boxes_per_row):
+    '''Plays one untimed game under tracemalloc and returns the peak number
+    of bytes allocated while setting up and playing it.'''
+    tracemalloc.start()
+    game = Game(boxes_per_row)
+    game.play_game_without_output()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def get_peak_rss():
+    '''Returns the peak resident set size of this process in kilobytes.
+    ru_maxrss is in kilobytes on Linux but in bytes on macOS.'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak //= 1024
+    return peak
+
+def play_for_peak_rss(boxes_per_row):
+    '''Plays one untimed game and returns the peak resident set size
+    of the process in kilobytes. Run in a child process by measure_peak_rss().'''
+    game = Game(boxes_per_row)
+    game.play_game_without_output()
+    return get_peak_rss()
+
+def measure_peak_rss(boxes_per_row):
+    '''Returns the peak resident set size in kilobytes of a new process which
+    plays one game on the board size. The peak of this process only ever grows, so
+    it would show the largest size benchmarked so far rather than this one. Includes
+    the memory of the interpreter and the modules it imports, which is the same
+    for every board size. The process is spawned rather than forked, since a forked
+    process starts out with the memory of this one.'''
+    pool = multiprocessing.get_context('spawn').Pool(1)
+    try:
+        return pool.apply(play_for_peak_rss, (boxes_per_row,))
+    finally:
+        pool.close()
+        pool.join()
+
+def fit_exponent(sizes, values):
+    '''Fits values ~ c * size^k by least squares on a log-log scale and returns k.
+    Returns None if there are not enough positive measurements to fit.'''
+    points = [(math.log(s), math.log(v)) for s, v in zip(sizes, values) if v > 0]
+    if len(points) < 2:
+        return None
+    slope, _ = statistics.linear_regression([p[0] for p in points], [p[1] for p in points])
+    return slope
+
+def run_benchmark(max_boxes_per_row, games_per_size, step=1, seed=0):
+    '''Benchmarks every board size from 2 up to max_boxes_per_row boxes per row.
+    Returns a list with one dictionary of measurements per size.'''
+
+    rows = []
+
+    for boxes_per_row in range(2, max_boxes_per_row + 1, step):
+        random.seed(seed)
+
+        component_times = {}
+        for component in COMPONENTS:
+            component_times[component] = []
+        move_latencies = []
+
+        for _ in range(games_per_size):
+            timings, latencies = play_timed_game(boxes_per_row)
+            for component in COMPONENTS:
+                component_times[component].append(timings[component])
+            move_latencies.extend(latencies)
+
+        move_latencies.sort()
+
+        row = {
+            'boxes_per_row': boxes_per_row,
+            'moves_per_game': len(move_latencies) / games_per_size,
+            'mean_move_latency': statistics.mean(move_latencies),
+            'p95_move_latency': move_latencies[int(0.95 * (len(move_latencies) - 1))],
+            'max_move_latency': move_latencies[-1],
+            'tracemalloc_peak': measure_peak_memory(boxes_per_row),
+            'peak_rss': measure_peak_rss(boxes_per_row),
+        }
+        for component in COMPONENTS:
+            row[component] = statistics.mean(component_times[component])
+
+        rows.append(row)
+
+    return rows
+
+def format_report(rows):
+    '''Returns the benchmark results as a formatted table, followed by
+    the fitted complexity exponent of each component.'''
+
+    output = '{:>6} {:>8} {:>12} {:>12} {:>12} {:>14} {:>12}'.format(
+        'boxes', 'moves', 'mean move s', 'p95 move s', 'max move s', 'tracemalloc B', 'peak RSS KB')
+    for component in COMPONENTS:
+        output += ' {:>22}'.format(component + ' s')
+    output += '\n'
+
+    for row in rows:
+        output += '{:>6} {:>8.0f} {:>12.2e} {:>12.2e} {:>12.2e} {:>14} {:>12}'.format(
+            row['boxes_per_row'],
+            row['moves_per_game'],
+            row['mean_move_latency'],
+            row['p95_move_latency'],
+            row['max_move_latency'],
+            row['tracemalloc_peak'],
+            row['peak_rss'])
+        for component in COMPONENTS:
+            output += ' {:>22.3e}'.format(row[component])
+        output += '\n'
+
+    output += '\nFitted exponent k in measurement ~ boxes_per_row^k:\n'
+
+    sizes = [row['boxes_per_row'] for row in rows]
+    for component in COMPONENTS + ['mean_move_latency', 'tracemalloc_peak']:
+        exponent = fit_exponent(sizes, [row[component] for row in rows])
+        if exponent is None:
+            output += '{:>24}: n/a\n'.format(component)
+        else:
+            output += '{:>24}: {:.2f}\n'.format(component, exponent)
+
+    return output
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures how the time and memory needed '
+        'to play Winning Player against Random Player grow with the size of the board.')
+    parser.add_argument('--max-boxes-per-row', type=int, default=12,
+        help='largest board size to benchmark (default: 12)')
+    parser.add_argument('--step', type=int, default=1,
+        help='difference between consecutive board sizes (default: 1)')
+    parser.add_argument('--games', type=int, default=3,
+        help='number of games played per board size (default: 3)')
+    parser.add_argument('--seed', type=int, default=0,
+        help='random seed used for each board size (default: 0)')
+    parser.add_argument('--output', default='scaling_benchmark.txt',
+        help='file the report is written to (default: scaling_benchmark.txt)')
+    args = parser.parse_args()
+
+    rows = run_benchmark(args.max_boxes_per_row, args.games, args.step, args.seed)
+    output = format_report(rows)
+
+    fp = open(args.output, 'w')
+    fp.write(output)
+    fp.close()
+
+    print(output)
+
+if __name__ == '__main__':
+    main()
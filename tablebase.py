@@ -0,0 +1,228 @@
+import argparse
+import mmap
+import os
+import struct
+
+from honors2 import Game
+
+# Identifies a tablebase file and the version of its layout.
+MAGIC = b'DBTB'
+VERSION = 1
+
+# The file starts with a header containing MAGIC, VERSION, the number of boxes per
+# row and the number of edges. It is followed by one signed byte per position.
+HEADER = struct.Struct('<4sHHI')
+
+# A position is written as an integer in which bit k is set if the edge with edge
+# id k (see Game.edges) has been drawn. The byte stored for a position is the
+# largest margin of boxes, out of the boxes not yet closed, which the player about to
+# move can guarantee over the other player from that position onwards.
+
+def get_position(game):
+    '''Returns the position of game as an integer of drawn edge ids.'''
+    position = 0
+    for edge_id, edge in enumerate(game.edges):
+        if game.am[edge[0]][edge[1]] == 2:
+            position |= 1 << edge_id
+    return position
+
+def _get_edge_box_masks(game):
+    '''For each edge id, returns a list containing, for each box the edge
+    is a side of, the position in which only that box's sides are drawn.'''
+    box_masks = []
+    for sides in game.box_edges:
+        mask = 0
+        for edge_id in sides:
+            mask |= 1 << edge_id
+        box_masks.append(mask)
+
+    edge_box_masks = []
+    for boxes in game.edge_boxes:
+        edge_box_masks.append([box_masks[box] for box in boxes])
+    return edge_box_masks
+
+def solve(boxes_per_row):
+    '''Computes the value of every position on a board with boxes_per_row boxes
+    per row by retrograde analysis. Returns a bytearray with one signed byte per
+    position, indexed by position.'''
+    game = Game(boxes_per_row)
+    total_edges = len(game.edges)
+    full_board = (1 << total_edges) - 1
+
+    edge_box_masks = _get_edge_box_masks(game)
+    edge_bits = [1 << edge_id for edge_id in range(total_edges)]
+
+    values = bytearray(1 << total_edges)
+    signed_values = memoryview(values).cast('b')
+
+    # Adding an edge always makes the position a larger number, so walking
+    # positions from largest to smallest means every position reached by a move
+    # has already been solved. The full board is worth 0 and is left as is.
+    for position in range(full_board - 1, -1, -1):
+        best = -128
+
+        for edge_id in range(total_edges):
+            bit = edge_bits[edge_id]
+            if position & bit:
+                continue
+
+            child = position | bit
+
+            boxes_closed = 0
+            for box_mask in edge_box_masks[edge_id]:
+                if child & box_mask == box_mask:
+                    boxes_closed += 1
+
+            # Closing a box earns it and keeps the turn, otherwise
+            # the other player moves next.
+            if boxes_closed:
+                value = boxes_closed + signed_values[child]
+            else:
+                value = -signed_values[child]
+
+            if value > best:
+                best = value
+
+        signed_values[position] = best
+
+    return values
+
+def write_tablebase(path, boxes_per_row):
+    '''Solves every position on a board with boxes_per_row boxes per row
+    and writes the results to the file at path.'''
+    total_edges = 2 * boxes_per_row * (boxes_per_row + 1)
+    values = solve(boxes_per_row)
+
+    fp = open(path, 'wb')
+    fp.write(HEADER.pack(MAGIC, VERSION, boxes_per_row, total_edges))
+    fp.write(values)
+    fp.close()
+
+def get_default_path(boxes_per_row):
+    '''Returns the name of the tablebase file for a board size.'''
+    return 'tablebase_{0}x{0}.bin'.format(boxes_per_row)
+
+class Tablebase:
+    '''A solved tablebase opened as a read-only memory map, so that looking up a
+    position only reads the page it is on and processes opening the same file share
+    the pages in memory.'''
+
+    def __init__(self, path):
+        self.fp = open(path, 'rb')
+
+        # An empty file cannot be mapped, and a file shorter than the header is not a
+        # tablebase file either, so both are turned away before mapping it.
+        if os.fstat(self.fp.fileno()).st_size < HEADER.size:
+            self.fp.close()
+            raise ValueError('{} is not a version {} tablebase file'.format(path, VERSION))
+
+        self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, boxes_per_row, total_edges = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('{} is not a version {} tablebase file'.format(path, VERSION))
+
+        # The file must hold one value for every position of the board size in the header.
+        if (total_edges != 2 * boxes_per_row * (boxes_per_row + 1) or
+                len(self.mm) != HEADER.size + (1 << total_edges)):
+            self.close()
+            raise ValueError('{} is truncated or does not match its header'.format(path))
+
+        self.boxes_per_row = boxes_per_row
+        self.total_edges = total_edges
+
+        # Signed view of the values, which follow the header.
+        self.values = memoryview(self.mm)[HEADER.size:].cast('b')
+
+    def lookup(self, position):
+        '''Returns the margin of remaining boxes the player about to move can
+        guarantee from position, given as an integer of drawn edge ids.'''
+        return self.values[position]
+
+    def _check_game(self, game):
+        '''Raises ValueError if game is not on the board size this tablebase is for.'''
+        if game.boxes_per_row != self.boxes_per_row:
+            raise ValueError('tablebase is for a board with {} boxes per row, not {}'.format(
+                self.boxes_per_row, game.boxes_per_row))
+
+    def lookup_game(self, game):
+        '''Returns the value of the current position of game for the player about to move.'''
+        self._check_game(game)
+        return self.values[get_position(game)]
+
+    def evaluate_moves(self, game):
+        '''Returns a list of (move, value) pairs for every valid move in game,
+        where value is the margin of remaining boxes the player making the move
+        can guarantee by making it.'''
+        self._check_game(game)
+        position = get_position(game)
+        results = []
+
+        for move in game.valid_moves:
+            edge_id = game.edge_ids[move]
+            child = position | (1 << edge_id)
+
+            boxes_closed = 0
+            for box in game.edge_boxes[edge_id]:
+                if game.box_sides[box] == 3:
+                    boxes_closed += 1
+
+            if boxes_closed:
+                value = boxes_closed + self.values[child]
+            else:
+                value = -self.values[child]
+
+            results.append( (move, value) )
+
+        return results
+
+    def close(self):
+        '''Releases the memory map and the file.'''
+        if getattr(self, 'values', None) is not None:
+            self.values.release()
+            self.values = None
+        self.mm.close()
+        self.fp.close()
+
+class PerfectPlayer:
+    '''Plays perfectly by always making the move with the highest tablebase value.'''
+
+    def __init__(self, tablebase):
+        self.tablebase = tablebase
+
+    def determine_next_move(self, game):
+        '''Returns the best possible move as a formatted string which can be
+        interpretted by Game.move().'''
+        best_move = None
+        best_value = None
+
+        for move, value in self.tablebase.evaluate_moves(game):
+            if best_value is None or value > best_value:
+                best_move = move
+                best_value = value
+
+        return '{} {}'.format(*best_move)
+
+def main():
+    parser = argparse.ArgumentParser(description='Solves every position on a small board '
+        'and writes the results to a tablebase file.')
+    parser.add_argument('boxes_per_row', type=int,
+        help='size of the board to solve (2 takes a moment, 3 takes a few minutes)')
+    parser.add_argument('--output', default=None,
+        help='file the tablebase is written to (default: tablebase_NxN.bin)')
+    args = parser.parse_args()
+
+    path = args.output
+    if path is None:
+        path = get_default_path(args.boxes_per_row)
+
+    write_tablebase(path, args.boxes_per_row)
+
+    tablebase = Tablebase(path)
+    print('Wrote {} positions to {}'.format(1 << tablebase.total_edges, path))
+    print('Value of the empty board for the first player: {}'.format(tablebase.lookup(0)))
+    tablebase.close()
+
+if __name__ == '__main__':
+    main()
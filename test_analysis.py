@@ -0,0 +1,19 @@
+from analysis import analyze_position, get_position_key, sample_positions
+
+def test_winning_player_move_is_valid_with_closed_box():
+    # Every side of box 0 drawn, so its closing moves are already made.
+    key = get_position_key(2, [(0, 1), (0, 3), (1, 4), (3, 4)])
+    analysis = analyze_position(key)
+    moves = [move for move, score in analysis['moves']]
+    assert analysis['winning_player_move'] in moves
+
+def test_winning_player_move_is_valid_in_sample_positions():
+    keys = set(get_position_key(boxes_per_row, edges)
+        for boxes_per_row, edges in sample_positions(3, 10, 0))
+    for key in keys:
+        analysis = analyze_position(key)
+        moves = [move for move, score in analysis['moves']]
+        if moves:
+            assert analysis['winning_player_move'] in moves
+        else:
+            assert analysis['winning_player_move'] is None
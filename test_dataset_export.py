@@ -0,0 +1,11 @@
+import numpy as np
+
+from dataset_export import export_games, load_positions, unpack_edges
+
+def test_moves_are_valid_in_their_positions(tmp_path):
+    export_games(str(tmp_path), 4, 50, 0, chunk_size=1000)
+    manifest, arrays = load_positions(str(tmp_path))
+    for edges, moves in zip(arrays['edges'], arrays['move']):
+        drawn = unpack_edges(np.asarray(edges), manifest['total_edges'])
+        assert (moves >= 0).all()
+        assert (drawn[np.arange(len(moves)), moves] == 0).all()
@@ -0,0 +1,15 @@
+from distributed import run_on_localhost, run_single_process
+
+def test_rejects_every_worker_crashing():
+    try:
+        run_on_localhost([(2, 40)], 0, 2, lease_size=10, crashing_workers=2)
+    except ValueError:
+        pass
+    else:
+        assert False, 'run_on_localhost() accepted only crashing workers'
+
+def test_recovers_from_crashing_worker():
+    jobs = [(2, 40)]
+    coordinator = run_on_localhost(jobs, 0, 2, lease_size=10, lease_timeout=5.0,
+        crashing_workers=1)
+    assert coordinator.results == run_single_process(jobs, 0, 10)
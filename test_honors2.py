@@ -0,0 +1,152 @@
+import io
+import random
+import sys
+
+import honors2
+from honors2 import get_sequential_confidence, play_games_until_precise
+
+def run_main(monkeypatch, tmp_path, answers):
+    '''Runs honors2.main() in tmp_path with answers as its input and returns
+    what it wrote to multiple_play.txt.'''
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(answers))
+    honors2.main()
+    fp = open(tmp_path / 'multiple_play.txt')
+    output = fp.read()
+    fp.close()
+    return output
+
+def test_main_plays_every_round_without_a_precision_answer(monkeypatch, tmp_path):
+    output = run_main(monkeypatch, tmp_path, '2\n1\n5\n')
+    assert 'Ties:' in output
+    assert 'confidence' not in output
+
+def test_main_stops_early_with_a_precision(monkeypatch, tmp_path):
+    output = run_main(monkeypatch, tmp_path, '2\n1\n2000\n0.05\n')
+    assert 'saved by stopping early' in output
+
+def test_sequential_confidence_is_split_between_checks():
+    assert get_sequential_confidence(0.95, 50, 100) == 0.95
+    assert abs(get_sequential_confidence(0.95, 1000, 100) - 0.995) < 1e-12
+    assert abs(get_sequential_confidence(0.95, 1001, 100) - (1 - 0.05 / 11)) < 1e-12
+
+def test_stopping_early_plays_the_first_games():
+    random.seed(0)
+    results = play_games_until_precise(2, 2000, 0.05)
+    random.seed(0)
+    every_result = [honors2.Game(2).play_game_without_output() for _ in range(len(results))]
+    assert len(results) < 2000
+    assert results == every_result
+
+def test_undoing_a_side_of_a_loaded_closed_box_takes_no_point():
+    game = honors2.Game(1)
+    game.load_position([(0, 1), (0, 2), (1, 3), (2, 3)])
+    assert game.undo_move('2 3') == 0
+    assert game.score == [0, 0]
+    assert game.board == [-1]
+    assert game.valid_moves == [(2, 3)]
+
+def count_sides(game):
+    '''Recounts the drawn sides of every box from the adjacency matrix.'''
+    sides = []
+    for box_edges in game.box_edges:
+        drawn = 0
+        for edge_id in box_edges:
+            i, j = game.edges[edge_id]
+            if game.am[i][j] == 2:
+                drawn += 1
+        sides.append(drawn)
+    return sides
+
+def check_bitboards(game):
+    '''Checks the bitboards of game against a recount from the adjacency matrix.'''
+    sides = count_sides(game)
+    assert game.box_sides == sides
+
+    drawn_edges = 0
+    capturing_edges = 0
+    safe_edges = 0
+    for edge_id, (i, j) in enumerate(game.edges):
+        bit = 1 << game.edge_bit(i, j)
+        if game.am[i][j] == 2:
+            drawn_edges |= bit
+            continue
+        most_sides = max(sides[box] for box in game.edge_boxes[edge_id])
+        if most_sides == 3:
+            capturing_edges |= bit
+        if most_sides < 2:
+            safe_edges |= bit
+    assert game.drawn_edges == drawn_edges
+    assert game.undrawn_edges() == game.all_edges & ~drawn_edges
+    assert game.capturing_edges() == capturing_edges
+    assert game.safe_edges() == safe_edges
+
+    for k in range(5):
+        boxes = 0
+        for box in range(game.total_boxes):
+            if sides[box] == k:
+                boxes |= 1 << game._get_box_dot(box)
+        assert game.boxes_with_sides(k) == boxes
+        assert game.count_boxes_with_sides(k) == sides.count(k)
+
+def play_and_undo(boxes_per_row, seed, check):
+    '''Plays a game of random moves, calling check(game) after every move, then
+    undoes every move, calling check(game) after each, and checks that the board
+    ends up as it started.'''
+    rng = random.Random(seed)
+    game = honors2.Game(boxes_per_row)
+    check(game)
+
+    moves = []
+    player = 0
+    while game.valid_moves:
+        move = '{} {}'.format(*rng.choice(game.valid_moves))
+        if game.move(player, move) == 0:
+            player = 1 - player
+        moves.append(move)
+        check(game)
+
+    for move in reversed(moves):
+        assert game.undo_move(move) == 0
+        check(game)
+
+    empty_game = honors2.Game(boxes_per_row)
+    assert game.valid_moves == empty_game.valid_moves
+    assert game.score == [0, 0]
+    assert game.board == empty_game.board
+    assert game.box_masks == empty_game.box_masks
+
+def test_bitboards_match_recount_through_play_and_undo():
+    for boxes_per_row in range(1, 6):
+        for seed in range(10):
+            play_and_undo(boxes_per_row, seed, check_bitboards)
+
+def check_move_classes(game):
+    '''Checks the capturing, sacrificing and safe moves of game against
+    a recount from the adjacency matrix.'''
+    sides = count_sides(game)
+    capturing_moves = set()
+    sacrificing_moves = set()
+    safe_moves = set()
+    for move in game.valid_moves:
+        most_sides = max(sides[box] for box in game.edge_boxes[game.edge_ids[move]])
+        if most_sides == 3:
+            capturing_moves.add(move)
+        elif most_sides == 2:
+            sacrificing_moves.add(move)
+        else:
+            safe_moves.add(move)
+
+    for move_set, moves in [(game.capturing_moves, capturing_moves),
+            (game.sacrificing_moves, sacrificing_moves), (game.safe_moves, safe_moves)]:
+        assert set(move_set) == moves
+        assert len(move_set) == len(moves)
+        for index, move in enumerate(move_set):
+            assert move in move_set
+            assert move_set[index] == move
+            assert move_set.positions[move] == index
+
+def test_move_classes_match_recount_through_play_and_undo():
+    for boxes_per_row in range(1, 6):
+        for seed in range(10):
+            play_and_undo(boxes_per_row, seed, check_move_classes)
@@ -0,0 +1,26 @@
+import sys
+
+import paired_evaluation
+from paired_evaluation import PLAYERS, play_paired_games, summarize_difference
+
+def test_summary_of_paired_games():
+    pair_results = play_paired_games(2, PLAYERS['winning'], PLAYERS['greedy'], 20, 0)
+    summary = summarize_difference([i[0] for i in pair_results], [i[2] for i in pair_results])
+    assert abs(summary['difference'] - (summary['mean_a'] - summary['mean_b'])) < 1e-9
+    assert summary['paired_se'] >= 0
+
+def test_needs_at_least_two_pairs(monkeypatch):
+    try:
+        summarize_difference([1], [0])
+    except ValueError:
+        pass
+    else:
+        assert False, 'a single pair was summarized'
+
+    monkeypatch.setattr(sys, 'argv', ['paired_evaluation.py', 'winning', 'greedy', '--pairs', '1'])
+    try:
+        paired_evaluation.main()
+    except SystemExit as error:
+        assert error.code == 2
+    else:
+        assert False, '--pairs 1 was accepted'
@@ -0,0 +1,14 @@
+from honors2 import Game
+from perft import check_against_reference, format_report, perft
+
+def test_perft_matches_reference():
+    for boxes_per_row in [1, 2]:
+        game = Game(boxes_per_row)
+        result = perft(game, len(game.valid_moves), 0, {})
+        assert check_against_reference(boxes_per_row, result) == []
+
+def test_nodes_per_second_only_reported_without_cache():
+    game = Game(1)
+    result = perft(game, len(game.valid_moves), 0, {})
+    assert 'Nodes per second' not in format_report(result, 1.0, 10, True)
+    assert 'Nodes per second' in format_report(result, 1.0, 10, False)
@@ -0,0 +1,325 @@
+import random
+
+import numpy as np
+
+from batched_play import play_games_batched
+from honors2 import (DecisionCache, Game, RandomPlayer, SumTree, WeightedRandomPlayer, WinningPlayer,
+    get_move_class_weights)
+
+class ReferenceBox:
+    '''The original Box class, which ReferenceWinningPlayer keeps one of per box.'''
+
+    def __init__(self, setup_moves, closing_moves):
+        self.setup_moves = setup_moves
+        self.closing_moves = closing_moves
+        self.setup = False
+        self.closable = False
+        self.final_move = None
+        self.closed = False
+
+    def check_if_set_up(self, am):
+        if self.setup or self.closed:
+            return
+        sm = self.setup_moves
+        if am[sm[0][0]][sm[0][1]] == 2 and am[sm[1][0]][sm[1][1]] == 2:
+            self.setup = True
+
+    def check_if_closable(self, am):
+        if self.closable or self.closed:
+            return False
+        cm = self.closing_moves
+        if self.setup:
+            if am[cm[0][0]][cm[0][1]] == 2:
+                self.closable = True
+                self.final_move = cm[1]
+                return True
+            elif am[cm[1][0]][cm[1][1]] == 2:
+                self.closable = True
+                self.final_move = cm[0]
+                return True
+        return False
+
+class ReferenceWinningPlayer:
+    '''The original WinningPlayer, which rescans every box on every move. Its
+    consecutive move handling is left out, since consecutive_move is never set.'''
+
+    def __init__(self, game):
+        self.ordered_moves = []
+        self.boxes = []
+
+        n = game.dots_per_row
+
+        for i in range(n-1):
+            self.ordered_moves.append( (i, i+1) )
+        self.ordered_moves.append( (n-1, 2*n - 1) )
+
+        offset = 0
+        while True:
+            offset += n
+            for i in range(offset + n - 2, offset + 1, -1):
+                self.ordered_moves.append( (i-1, i) )
+            if offset + n > game.total_dots - 1:
+                break
+            self.ordered_moves.append( (offset-n, offset) )
+            self.ordered_moves.append( (offset, offset+n) )
+            offset += n
+            for i in range(offset, offset + n - 2):
+                self.ordered_moves.append( (i, i+1) )
+            if offset + 2*n -1 > game.total_dots - 1:
+                break
+            self.ordered_moves.append( (offset - 1, offset + n - 1) )
+            self.ordered_moves.append( (offset + n - 1, offset + 2*n - 1) )
+        self.ordered_moves.append( (2*n -2, 2*n -1) )
+
+        for i in range(game.total_dots):
+            if i % n == n-1 or i >= n*(n-1):
+                pass
+            elif i == n - 2:
+                self.boxes.append(ReferenceBox( ((i, i+1), (i+1, i+n+1)), ((i, i+n), (i+n, i+n+1)) ))
+            elif i % (n*2) == n:
+                self.boxes.append(ReferenceBox( ((i, i+n), (i+n, i+n+1)), ((i, i+1), (i+1, i+n+1)) ))
+            elif i % (n*2) == 2*n - 2:
+                self.boxes.append(ReferenceBox( ((i, i+1), (i+1, i+n+1)), ((i, i+n), (i+n, i+n+1)) ))
+            elif i % (n*2) == 0:
+                self.boxes.append(ReferenceBox( ((i, i+1), (i, i+n)), ((i+1, i+n+1), (i+n, i+n+1)) ))
+            elif i % (n*2) == n - 2:
+                self.boxes.append(ReferenceBox( ((i+1, i+n+1), (i+n, i+n+1)), ((i, i+1), (i, i+n)) ))
+            else:
+                self.boxes.append(ReferenceBox( ((i, i+1), (i+n, i+n+1)), ((i, i+n), (i+1, i+n+1)) ))
+
+    def determine_next_move(self, game):
+        next_move = None
+
+        self.ordered_moves = [move for move in self.ordered_moves if move in game.valid_moves]
+
+        for box in self.boxes:
+            box.check_if_set_up(game.am)
+            if box.check_if_closable(game.am):
+                next_move = box.final_move
+
+        if not next_move:
+            if self.ordered_moves:
+                next_move = self.ordered_moves.pop(0)
+            else:
+                next_move = game.valid_moves[0]
+
+        return '{} {}'.format(*next_move)
+
+class MoveRecorder:
+    '''Recorder for Game.play_game_between() which keeps every move in order.'''
+
+    def __init__(self):
+        self.moves = []
+
+    def record_move(self, game, player, move):
+        self.moves.append( (player, move) )
+
+    def record_outcome(self, game, outcome):
+        pass
+
+def play(boxes_per_row, make_player, seed):
+    '''Plays a game of the player made by make_player(game) against Random Player
+    drawing from a generator seeded with seed. Returns the moves and the result.'''
+    rng = random.Random(seed)
+    game = Game(boxes_per_row)
+    recorder = MoveRecorder()
+    result = game.play_game_between(make_player(game), RandomPlayer(game, rng),
+        rng.randint(0, 1), recorder)
+    return recorder.moves, result
+
+def test_winning_player_matches_reference():
+    for boxes_per_row in range(1, 7):
+        for seed in range(20):
+            assert play(boxes_per_row, WinningPlayer, seed) == \
+                play(boxes_per_row, ReferenceWinningPlayer, seed)
+
+def test_winning_player_matches_reference_from_loaded_position():
+    rng = random.Random(0)
+    for _ in range(200):
+        game = Game(4)
+        reference_game = Game(4)
+        edges = rng.sample(game.edges, rng.randint(0, len(game.edges) - 1))
+        game.load_position(edges)
+        reference_game.load_position(edges)
+        assert WinningPlayer(game).determine_next_move(game) == \
+            ReferenceWinningPlayer(reference_game).determine_next_move(reference_game)
+
+def test_batched_matches_scalar():
+    for boxes_per_row in [1, 2, 3, 5]:
+        rng = np.random.default_rng(boxes_per_row)
+        rounds, score_1, score_2, outcomes, moves, starting_players = play_games_batched(
+            boxes_per_row, 50, rng, record_moves=True)
+
+        for g in range(50):
+            # Replays the batched game on a scalar board, checking that a scalar
+            # Winning Player chooses every one of the batched Winning Player's moves.
+            game = Game(boxes_per_row)
+            player = WinningPlayer(game)
+            for active_player, edge_id in moves[g]:
+                move = '{} {}'.format(*game.edges[edge_id])
+                if active_player == 0:
+                    assert player.determine_next_move(game) == move
+                game.move(active_player, move)
+
+            assert moves[g][0][0] == starting_players[g]
+            assert len(moves[g]) == rounds[g]
+            assert game.score == [score_1[g], score_2[g]]
+
+def test_fast_forward_matches_full_game():
+    for boxes_per_row in [2, 3, 4]:
+        for seed in range(30):
+            random.seed(seed)
+            full = Game(boxes_per_row).play_game_without_output()
+            random.seed(seed)
+            # verify checks the fast-forwarded board and score against
+            # Game.get_forced_outcome() and raises if they differ.
+            fast = Game(boxes_per_row).play_game_without_output(fast_forward=True, verify=True)
+            assert fast[1:] == full[1:]
+
+def check_cache_gives_same_moves(boxes_per_row, games, cache):
+    for seed in range(games):
+        assert play(boxes_per_row, lambda game: WinningPlayer(game, cache), seed) == \
+            play(boxes_per_row, WinningPlayer, seed)
+
+def test_decision_cache_gives_same_moves():
+    for boxes_per_row in [2, 3, 4]:
+        cache = DecisionCache()
+        check_cache_gives_same_moves(boxes_per_row, 200, cache)
+        assert cache.hits > 0
+
+def test_decision_cache_gives_same_moves_with_evictions():
+    cache = DecisionCache(max_bytes=20000)
+    check_cache_gives_same_moves(4, 200, cache)
+    assert cache.evictions > 0
+    assert cache.bytes <= cache.max_bytes
+
+def test_decision_cache_gives_same_moves_when_skipping():
+    cache = DecisionCache(min_hit_rate=0.9, trial_lookups=4)
+    check_cache_gives_same_moves(4, 200, cache)
+    assert cache.skipped > 0
+
+def test_decision_cache_is_for_one_board_size():
+    cache = DecisionCache()
+    WinningPlayer(Game(3), cache)
+    try:
+        WinningPlayer(Game(4), cache)
+    except ValueError:
+        pass
+    else:
+        assert False, 'a cache for 3x3 boards was used on a 4x4 board'
+
+def test_sum_tree_matches_list_of_weights():
+    rng = random.Random(0)
+    for size in [1, 2, 3, 7, 8, 33]:
+        tree = SumTree(size)
+        weights = [0] * size
+        for _ in range(200):
+            index = rng.randrange(size)
+            # Whole weights keep the sums exact, so the ends of each range are exact too.
+            weights[index] = rng.choice([0, 0, 1, 2, rng.randint(1, 100)])
+            tree[index] = weights[index]
+
+            assert [tree[i] for i in range(size)] == weights
+            assert tree.total() == sum(weights)
+
+            # Every value within a weight's range finds it.
+            start = 0
+            for i, weight in enumerate(weights):
+                if weight > 0:
+                    assert tree.find(start) == i
+                    assert tree.find(start + weight - 0.5) == i
+                start += weight
+
+class CheckedWeightedRandomPlayer(WeightedRandomPlayer):
+    """WeightedRandomPlayer which checks its weights against get_weight()
+    and its sums against the weights every time it moves."""
+
+    def determine_next_move(self, game):
+        move = WeightedRandomPlayer.determine_next_move(self, game)
+
+        for edge_id, edge in enumerate(game.edges):
+            if game.am[edge[0]][edge[1]] == 1:
+                assert self.weights[edge_id] == self.get_weight(game, edge)
+            else:
+                assert self.weights[edge_id] == 0
+
+        tree = self.weights.tree
+        for node in range(1, self.weights.capacity):
+            assert tree[node] == tree[2 * node] + tree[2 * node + 1]
+
+        return move
+
+def test_weighted_random_player_keeps_weights_up_to_date():
+    get_weight = get_move_class_weights(capturing=5, safe=2, sacrificing=1)
+    for boxes_per_row in range(1, 6):
+        for seed in range(10):
+            moves, result = play(boxes_per_row, lambda game: CheckedWeightedRandomPlayer(game,
+                get_weight, random.Random(seed + 1000)), seed)
+            assert sum(result[1:3]) == boxes_per_row ** 2
+
+def test_weighted_random_player_picks_uniformly_when_every_weight_is_0():
+    # With every weight 0, moves are picked from valid_moves as Random Player picks them.
+    for boxes_per_row in range(1, 5):
+        for seed in range(10):
+            assert play(boxes_per_row, lambda game: WeightedRandomPlayer(game,
+                lambda game, move: 0, random.Random(seed + 1000)), seed) == \
+                play(boxes_per_row, lambda game: RandomPlayer(game, random.Random(seed + 1000)), seed)
+
+def reference_play_with_output(game, starting_player):
+    '''The original Game.play_with_output(), which built the play-by-play as it played.'''
+    winning_player = WinningPlayer(game)
+    active_player = starting_player
+    output = 'Player {} goes first!\n'.format(game._get_player_name(active_player))
+    output += game.draw_board()
+
+    while sum(game.score) < game.total_boxes:
+        if active_player == 0:
+            output += "Player A's turn!\n"
+            result = game.move(active_player, winning_player.determine_next_move(game))
+        else:
+            output += "Player B's turn!\n"
+            result = game.random_play(active_player)
+        if result == 0:
+            active_player = 1 - active_player
+        output += game.draw_board()
+
+    output += 'Game is over, all boxes have been filled\n'
+    if game.score[0] > game.score[1]:
+        output += 'Player A wins!'
+    elif game.score[1] > game.score[0]:
+        output += 'Player B wins!'
+    else:
+        output += "It's a tie!"
+    return output
+
+def test_play_with_output_matches_reference():
+    for boxes_per_row in range(1, 6):
+        for seed in range(10):
+            random.seed(seed)
+            output = Game(boxes_per_row).play_with_output(seed % 2)
+            random.seed(seed)
+            assert output == reference_play_with_output(Game(boxes_per_row), seed % 2)
+
+def test_play_events_without_output_matches_play_game_without_output():
+    for boxes_per_row in range(1, 6):
+        for seed in range(20):
+            random.seed(seed)
+            recorder = MoveRecorder()
+            result = Game(boxes_per_row).play_game_without_output(recorder)
+            after = random.random()
+
+            random.seed(seed)
+            events = list(Game(boxes_per_row).play_events_without_output())
+            assert random.random() == after
+
+            assert [(event.player, event.move) for event in events] == recorder.moves
+            rounds = len(events)
+            score = events[-1].score
+            if score[0] > score[1]:
+                outcome = 0
+            elif score[1] > score[0]:
+                outcome = 1
+            else:
+                outcome = 2
+            assert (rounds, score[0], score[1], outcome) == result
+            assert sum(event.boxes_captured for event in events) == boxes_per_row ** 2
@@ -0,0 +1,17 @@
+import random
+
+from game_results import ResultsStore, add_result, new_aggregate
+from honors2 import Game
+
+def test_stores_results_of_games_stopped_early(tmp_path):
+    random.seed(0)
+    results = [Game(3).play_game_without_output(stop_when_decided=True) for _ in range(20)]
+
+    store = ResultsStore(str(tmp_path / 'results.db'))
+    store.add_run(3, 0, results, [0] * len(results))
+
+    expected = new_aggregate()
+    for result in results:
+        add_result(expected, result[:4])
+    assert store.query_aggregate(3) == expected
+    store.close()
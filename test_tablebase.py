@@ -0,0 +1,44 @@
+from honors2 import Game
+from tablebase import Tablebase, write_tablebase
+
+def raises_value_error(function, *args):
+    try:
+        function(*args)
+    except ValueError:
+        return True
+    return False
+
+def test_values_of_1x1_board(tmp_path):
+    path = str(tmp_path / 'tablebase_1x1.bin')
+    write_tablebase(path, 1)
+    tablebase = Tablebase(path)
+    # Whoever draws the fourth side closes the box, which is the second player.
+    assert tablebase.lookup_game(Game(1)) == -1
+    tablebase.close()
+
+def test_rejects_truncated_file(tmp_path):
+    path = str(tmp_path / 'tablebase_1x1.bin')
+    write_tablebase(path, 1)
+    fp = open(path, 'rb')
+    data = fp.read()
+    fp.close()
+    for length in [0, 4, len(data) - 1]:
+        fp = open(path, 'wb')
+        fp.write(data[:length])
+        fp.close()
+        # The error must come from Tablebase's own checks, which close the file,
+        # rather than from mapping an empty file.
+        try:
+            Tablebase(path)
+        except ValueError as error:
+            assert path in str(error)
+        else:
+            assert False, 'a file of {} bytes was opened'.format(length)
+
+def test_rejects_game_of_another_size(tmp_path):
+    path = str(tmp_path / 'tablebase_1x1.bin')
+    write_tablebase(path, 1)
+    tablebase = Tablebase(path)
+    assert raises_value_error(tablebase.lookup_game, Game(2))
+    assert raises_value_error(tablebase.evaluate_moves, Game(2))
+    tablebase.close()
@@ -0,0 +1,82 @@
+import random
+
+from honors2 import Game, WinningPlayer
+from topology import Topology, write_topology
+
+def raises_value_error(function, *args):
+    try:
+        function(*args)
+    except ValueError:
+        return True
+    return False
+
+def test_tables_match_tables_worked_out_from_scratch(tmp_path):
+    for boxes_per_row in range(1, 7):
+        path = str(tmp_path / 'topology.bin')
+        write_topology(path, boxes_per_row)
+        topology = Topology(path)
+
+        game = Game(boxes_per_row)
+        loaded_game = Game(boxes_per_row, topology)
+        assert list(loaded_game.edges) == game.edges
+        assert dict(loaded_game.edge_ids) == game.edge_ids
+        assert list(loaded_game.edge_boxes) == game.edge_boxes
+        assert list(loaded_game.box_edges) == game.box_edges
+        assert [loaded_game.edge_boxes[edge_id] for edge_id in range(len(game.edges))] == \
+            game.edge_boxes
+        assert (0, boxes_per_row + 2) not in loaded_game.edge_ids
+
+        player = WinningPlayer(game)
+        loaded_player = WinningPlayer(loaded_game)
+        assert list(loaded_player.ordered_moves) == player.ordered_moves
+        assert list(loaded_player.setup_moves) == list(player.setup_moves)
+        assert list(loaded_player.closing_moves) == list(player.closing_moves)
+
+        for seed in range(5):
+            random.seed(seed)
+            result = Game(boxes_per_row).play_game_without_output()
+            random.seed(seed)
+            assert Game(boxes_per_row, topology).play_game_without_output() == result
+
+        del loaded_game, loaded_player
+        topology.close()
+
+def test_bitboards_match_every_edge_and_box():
+    for boxes_per_row in range(1, 7):
+        game = Game(boxes_per_row)
+        all_boxes = 0
+        for box in range(game.total_boxes):
+            all_boxes |= 1 << game._get_box_dot(box)
+        all_edges = 0
+        for edge in game.edges:
+            all_edges |= 1 << game.edge_bit(*edge)
+        assert game.all_boxes == all_boxes
+        assert game.all_edges == all_edges
+
+def test_adjacency_matrix_reads_0_for_dots_which_are_not_adjacent():
+    game = Game(2)
+    for i in range(game.total_dots):
+        for j in range(i + 1, game.total_dots):
+            if (i, j) in game.edge_ids:
+                assert game.am[i][j] == 1
+            else:
+                assert game.am[i][j] == 0
+
+def test_rejects_truncated_file(tmp_path):
+    path = str(tmp_path / 'topology.bin')
+    write_topology(path, 2)
+    fp = open(path, 'rb')
+    data = fp.read()
+    fp.close()
+    for length in [0, 4, len(data) - 1]:
+        fp = open(path, 'wb')
+        fp.write(data[:length])
+        fp.close()
+        assert raises_value_error(Topology, path)
+
+def test_rejects_game_of_another_size(tmp_path):
+    path = str(tmp_path / 'topology.bin')
+    write_topology(path, 2)
+    topology = Topology(path)
+    assert raises_value_error(Game, 3, topology)
+    topology.close()
@@ -0,0 +1,255 @@
+import argparse
+import array
+import collections.abc
+import mmap
+import os
+import struct
+import time
+
+from honors2 import Game, WinningPlayer
+
+# Identifies a topology file and the version of its layout.
+MAGIC = b'DBTP'
+VERSION = 2
+
+# The file starts with a header containing MAGIC, VERSION, the number of boxes per
+# row, the number of edges, the number of boxes and the number of moves in Winning
+# Player's plan. It is followed by these tables of 32-bit integers in the byte order
+# of the machine which wrote the file, in order:
+#
+#  edges         - the two dots of each edge id (Game.edges).
+#  dot_edges     - the edge ids of the edges from each dot to the dot to its right
+#                  and to the dot underneath it, or -1 where there is no such dot
+#                  (used for Game.edge_ids).
+#  edge_boxes    - the one or two boxes each edge id is a side of, padded
+#                  with -1 (Game.edge_boxes).
+#  box_edges     - the four sides of each box (Game.box_edges).
+#  ordered_moves - the two dots of each of Winning Player's ordered moves
+#                  (WinningPlayer.ordered_moves).
+#  setup_moves   - edge ids of the two setup moves of each box (WinningPlayer.setup_moves).
+#  closing_moves - edge ids of the two closing moves of each box (WinningPlayer.closing_moves).
+HEADER = struct.Struct('<4sHHIII')
+
+def get_tables(boxes_per_row, plan_length):
+    '''Returns a list of (name, number of integers) pairs giving the
+    tables of a topology file, in order.'''
+    total_dots = (boxes_per_row + 1) ** 2
+    total_edges = 2 * boxes_per_row * (boxes_per_row + 1)
+    total_boxes = boxes_per_row ** 2
+    return [
+        ('edges', 2 * total_edges),
+        ('dot_edges', 2 * total_dots),
+        ('edge_boxes', 2 * total_edges),
+        ('box_edges', 4 * total_boxes),
+        ('ordered_moves', 2 * plan_length),
+        ('setup_moves', 2 * total_boxes),
+        ('closing_moves', 2 * total_boxes),
+    ]
+
+def write_topology(path, boxes_per_row):
+    '''Works out the edge and box tables and Winning Player's plan for a board
+    with boxes_per_row boxes per row and writes them to a topology file at path.'''
+    game = Game(boxes_per_row)
+    player = WinningPlayer(game)
+    n = game.dots_per_row
+
+    edges = array.array('i')
+    for edge in game.edges:
+        edges.extend(edge)
+
+    dot_edges = array.array('i')
+    for i in range(game.total_dots):
+        dot_edges.append(game.edge_ids.get( (i, i+1), -1 ))
+        dot_edges.append(game.edge_ids.get( (i, i+n), -1 ))
+
+    edge_boxes = array.array('i')
+    for boxes in game.edge_boxes:
+        edge_boxes.extend(boxes)
+        if len(boxes) == 1:
+            edge_boxes.append(-1)
+
+    box_edges = array.array('i')
+    for sides in game.box_edges:
+        box_edges.extend(sides)
+
+    ordered_moves = array.array('i')
+    for move in player.ordered_moves:
+        ordered_moves.extend(move)
+
+    fp = open(path, 'wb')
+    fp.write(HEADER.pack(MAGIC, VERSION, boxes_per_row, len(game.edges), game.total_boxes,
+        len(player.ordered_moves)))
+    for table in [edges, dot_edges, edge_boxes, box_edges, ordered_moves,
+            player.setup_moves, player.closing_moves]:
+        table.tofile(fp)
+    fp.close()
+
+def get_default_path(boxes_per_row):
+    '''Returns the name of the topology file for a board size.'''
+    return 'topology_{0}x{0}.bin'.format(boxes_per_row)
+
+class TupleTable(collections.abc.Sequence):
+    '''A table of a topology file read as a sequence of tuples of width integers,
+    which are read from the memory map each time an entry is looked up rather than
+    copied out of it. If padded is True, entries shorter than width are padded with
+    -1 in the file, which is left out of the tuple.'''
+
+    def __init__(self, view, width, padded=False):
+        self.view = view
+        self.width = width
+        self.padded = padded
+
+    def __len__(self):
+        return len(self.view) // self.width
+
+    def __getitem__(self, index):
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('table index out of range')
+
+        start = index * self.width
+        entry = tuple(self.view[start:start + self.width])
+        if self.padded and entry[-1] == -1:
+            entry = entry[:entry.index(-1)]
+        return entry
+
+    def __iter__(self):
+        values = iter(self.view)
+        entries = zip(*[values] * self.width)
+        if not self.padded:
+            return entries
+        return (entry[:entry.index(-1)] if entry[-1] == -1 else entry for entry in entries)
+
+class EdgeIdTable(collections.abc.Mapping):
+    '''Maps each edge (i, j) to its edge id, as Game.edge_ids does, by looking the
+    edge up in the dot_edges table of a topology file.'''
+
+    def __init__(self, edges, dot_edges, dots_per_row):
+        self.edges = edges
+        self.dot_edges = dot_edges
+        self.dots_per_row = dots_per_row
+
+    def __getitem__(self, edge):
+        i, j = edge
+        edge_id = -1
+        if 0 <= i < len(self.dot_edges) // 2:
+            if j == i + 1:
+                edge_id = self.dot_edges[2 * i]
+            elif j == i + self.dots_per_row:
+                edge_id = self.dot_edges[2 * i + 1]
+        if edge_id == -1:
+            raise KeyError(edge)
+        return edge_id
+
+    def __len__(self):
+        return len(self.edges)
+
+    def __iter__(self):
+        return iter(self.edges)
+
+class Topology:
+    '''The tables of a topology file opened as a read-only memory map. Game and
+    WinningPlayer index the tables in the map directly (see TupleTable), so opening
+    a board of any size reads nothing but the pages it uses, and processes opening
+    the same file share its pages in memory. Must not be closed while a Game or
+    WinningPlayer set up from it is still in use.'''
+
+    def __init__(self, path):
+        self.fp = open(path, 'rb')
+
+        # An empty file cannot be mapped, and a file shorter than the header is not a
+        # topology file either, so both are turned away before mapping it.
+        if os.fstat(self.fp.fileno()).st_size < HEADER.size:
+            self.fp.close()
+            raise ValueError('{} is not a version {} topology file'.format(path, VERSION))
+
+        self.mm = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Memoryviews of the map, kept so that they can be released.
+        self.views = []
+
+        magic, version, boxes_per_row, total_edges, total_boxes, plan_length = \
+            HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('{} is not a version {} topology file'.format(path, VERSION))
+
+        # The file must hold every table for the board size in the header.
+        tables = get_tables(boxes_per_row, plan_length)
+        size = HEADER.size + 4 * sum(length for name, length in tables)
+        if (total_edges != 2 * boxes_per_row * (boxes_per_row + 1) or
+                total_boxes != boxes_per_row ** 2 or len(self.mm) != size):
+            self.close()
+            raise ValueError('{} is truncated or does not match its header'.format(path))
+
+        self.boxes_per_row = boxes_per_row
+
+        view = memoryview(self.mm)
+        self.views.append(view)
+
+        offset = HEADER.size
+        for name, length in tables:
+            table = view[offset:offset + 4 * length].cast('i')
+            self.views.append(table)
+            setattr(self, '_' + name, table)
+            offset += 4 * length
+
+        # The tables as Game and WinningPlayer use them.
+        self.edges = TupleTable(self._edges, 2)
+        self.edge_ids = EdgeIdTable(self.edges, self._dot_edges, boxes_per_row + 1)
+        self.edge_boxes = TupleTable(self._edge_boxes, 2, padded=True)
+        self.box_edges = TupleTable(self._box_edges, 4)
+        self.ordered_moves = TupleTable(self._ordered_moves, 2)
+        self.setup_moves = self._setup_moves
+        self.closing_moves = self._closing_moves
+
+    def close(self):
+        '''Releases the memory map and the file.'''
+        # Views are released in the reverse order they were made, since a
+        # view cannot be released while a table cut from it is still held.
+        for view in reversed(self.views):
+            view.release()
+        self.views = []
+        self.mm.close()
+        self.fp.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Writes the edge and box tables and '
+        "Winning Player's plan for a board size to a topology file, which Game and "
+        'WinningPlayer can then read through a memory map instead of working them out.')
+    parser.add_argument('boxes_per_row', type=int,
+        help='size of the board to write the tables for')
+    parser.add_argument('--output', default=None,
+        help='file the tables are written to (default: topology_NxN.bin)')
+    args = parser.parse_args()
+
+    path = args.output
+    if path is None:
+        path = get_default_path(args.boxes_per_row)
+
+    start = time.perf_counter()
+    write_topology(path, args.boxes_per_row)
+    written = time.perf_counter() - start
+
+    start = time.perf_counter()
+    game = Game(args.boxes_per_row)
+    WinningPlayer(game)
+    from_scratch = time.perf_counter() - start
+
+    start = time.perf_counter()
+    topology = Topology(path)
+    game = Game(args.boxes_per_row, topology)
+    WinningPlayer(game)
+    from_file = time.perf_counter() - start
+
+    print('Wrote {} ({} bytes) in {:.3f} s'.format(path, os.path.getsize(path), written))
+    print('Game and Winning Player set up in {:.3f} s from scratch and {:.3f} s from '
+        'the file'.format(from_scratch, from_file))
+
+    del game
+    topology.close()
+
+if __name__ == '__main__':
+    main()